@@ -0,0 +1,282 @@
+"""
+    Honour Project: ANU Study Planner
+"""
+
+"""
+    In this program, we keep results that are expensive to compute (scraped
+    program orders, solved plans, ...) so that repeated requests do not need to
+    compute them again. A small in-memory LRU cache sits in front of an
+    optional on-disk store, and both can expire entries after a while.
+"""
+
+import collections
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+# Cached results are kept under CACHE_DIR; set PLANNER_CACHE_DIR to an empty
+# string to keep them in memory only.
+CACHE_DIR = os.environ.get('PLANNER_CACHE_DIR',
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache'))
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory cache which forgets the least recently used entry when full.
+    """
+    def __init__(self, maxsize=128, ttl=None):
+        """
+        :param maxsize: Maximum number of entries kept in memory.
+        :param ttl: Seconds an entry stays valid, or None to keep it until evicted.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires, value = entry
+            if expires is not None and expires < time.time():
+                del self.data[key]
+                return default
+            self.data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        expires = None if self.ttl is None else time.time() + self.ttl
+        with self.lock:
+            self.data[key] = (expires, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+class DiskStore:
+    """
+    Store pickled entries as files in a directory, one file per key.
+    """
+    def __init__(self, directory, ttl=None):
+        """
+        :param directory: Directory holding the entries, created if it does not exist.
+        :param ttl: Seconds an entry stays valid after it was written, or None for no expiry.
+        """
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        name = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + '.pickle')
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            if self.ttl is not None and os.path.getmtime(path) + self.ttl < time.time():
+                os.remove(path)
+                return default
+            with open(path, 'rb') as entry_file:
+                stored_key, value = pickle.load(entry_file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return default
+        # Guard against two keys whose repr hash to the same file name.
+        if stored_key != key:
+            return default
+        return value
+
+    def put(self, key, value):
+        # Write to a temporary file first so readers never see half an entry.
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as entry_file:
+                pickle.dump((key, value), entry_file, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self._path(key))
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def invalidate(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.pickle'):
+                os.remove(os.path.join(self.directory, name))
+
+
+class _Call:
+    """A computation in flight, shared by every caller of SingleFlight.do with its key."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # The cancelled functions of the callers waiting for the result, None for a caller
+        # that waits until the end.
+        self.waiters = list()
+        # Set once every waiter was cancelled, the computation may then have been cut short.
+        self.abandoned = False
+        self.lock = threading.Lock()
+
+    def cancelled(self):
+        """Tell whether every caller waiting for the result was cancelled."""
+        with self.lock:
+            if not self.abandoned:
+                self.abandoned = all(waiter is not None and waiter() for waiter in self.waiters)
+            return self.abandoned
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key: while one caller computes the
+    value, later callers with the same key wait for it and share its result
+    (or its exception) instead of computing it again.
+
+    Callers may tell when they stop waiting. The computation is only cancelled
+    once all of them did, and a caller still waiting for a computation that
+    was cancelled computes the value again rather than sharing a result that
+    was cut short.
+    """
+    def __init__(self):
+        self.calls = dict()
+        self.lock = threading.Lock()
+
+    def do(self, key, func, cancelled=None):
+        """
+        Return func(), or the result of the call of func for key that is already running.
+
+        :param cancelled: Optional function returning True once this caller stops waiting.
+        When given, func is called as func(cancelled) with a function returning True once
+        every caller waiting for its result stopped waiting.
+        """
+        while True:
+            with self.lock:
+                call = self.calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _Call()
+                    self.calls[key] = call
+                with call.lock:
+                    call.waiters.append(cancelled)
+            if leader:
+                break
+            call.done.wait()
+            if call.abandoned and not (cancelled is not None and cancelled()):
+                # Cut short for the callers that left, this caller still wants the value.
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func() if cancelled is None else func(call.cancelled)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
+
+
+class TieredCache:
+    """
+    An LRUCache in front of an optional DiskStore. Entries found on disk are
+    copied into memory, and new entries are written to both.
+    """
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self.flights = SingleFlight()
+
+    def get(self, key, default=None):
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key, _MISSING)
+            if value is not _MISSING:
+                self.memory.put(key, value)
+                return value
+        return default
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def get_or_compute(self, key, compute, keep=None, cancelled=None, flight_key=None):
+        """
+        Return the cached value of key, calling compute() and caching its result on a miss.
+        Concurrent misses for the same key wait for a single call of compute().
+
+        :param keep: Optional function telling whether a computed value may be cached, e.g.
+        to leave out results that were cut short.
+        :param cancelled: Optional function returning True once the caller stops waiting.
+        When given, compute is called as compute(cancelled) with a function returning True
+        once every caller waiting for the value stopped waiting, see SingleFlight.do().
+        :param flight_key: Key under which concurrent misses are coalesced, key if None, e.g. to
+        keep apart calls of compute() that find the same value under different deadlines.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            if cancelled is None:
+                value = self.flights.do(key if flight_key is None else flight_key,
+                                        lambda: self._compute(key, compute, keep))
+            else:
+                value = self.flights.do(key if flight_key is None else flight_key,
+                                        lambda everyone_cancelled: self._compute(
+                                                key, lambda: compute(everyone_cancelled), keep),
+                                        cancelled)
+        return value
+
+    def _compute(self, key, compute, keep):
+        # The previous call for this key may have just finished, check again.
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            if keep is None or keep(value):
+                self.put(key, value)
+        return value
+
+    def invalidate(self, key):
+        self.memory.invalidate(key)
+        if self.disk is not None:
+            self.disk.invalidate(key)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+
+def disk_store(name, ttl=None):
+    """
+    Return a DiskStore in the sub-directory name of CACHE_DIR, or None if the
+    on-disk cache is turned off.
+    """
+    if not CACHE_DIR:
+        return None
+    return DiskStore(os.path.join(CACHE_DIR, name), ttl)
@@ -0,0 +1,167 @@
+"""
+    Honour Project: ANU Study Planner
+"""
+
+"""
+    In this program, we keep the requisites of every course in a compact form.
+    Course codes are interned to integer ids, and the prerequisites,
+    corequisites and incompatible courses of all courses are stored in three
+    dense int32 arrays indexed by those ids, with NO_COURSE marking an empty
+    slot. A CourseCatalog is never modified once built, so one instance is
+    shared by every request; loading new data builds a new catalog instead.
+
+    The catalog also indexes, for every course, the transitive closure of its
+    prerequisites and corequisites, so the requisites of a set of courses are
+    a union of precomputed sets.
+
+    RequisiteView gives the old dict interface on top of it, mapping a course
+    code to an array of course codes padded with None.
+"""
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+import numpy as np
+
+NO_COURSE = -1
+# Shapes of the requisites of one course: 3 prerequisite clauses of up to 3
+# alternatives, 1 corequisite and up to 3 incompatible courses.
+PREREQ_SHAPE = (3, 3)
+COREQ_SHAPE = (1, 1)
+INCOMPAT_SHAPE = (1, 3)
+
+
+class CourseCatalog:
+    """
+    Interned course codes with their requisites in read-only int32 arrays.
+
+    prereq[i], coreq[i] and incompat[i] hold the requisites of the course with id i as ids,
+    NO_COURSE where there is none.
+    """
+    def __init__(self, prereq, coreq, incompat):
+        """
+        :param prereq: Dict of course code: 3x3 array-like of course codes or None.
+        :param coreq: Dict of course code: 1x1 array-like of course codes or None.
+        :param incompat: Dict of course code: 1x3 array-like of course codes or None.
+        """
+        codes = set()
+        for table in (prereq, coreq, incompat):
+            codes.update(table)
+            for rows in table.values():
+                codes.update(code for row in rows for code in row if code is not None)
+        self.codes = sorted(codes)
+        self.ids = {code: i for i, code in enumerate(self.codes)}
+        # Courses each table has an entry for, so that the views can tell a course
+        # without requisites from one that was never recorded.
+        self.listed = {
+            'prereq': frozenset(prereq),
+            'coreq': frozenset(coreq),
+            'incompat': frozenset(incompat),
+            }
+        self.prereq = self._intern(prereq, PREREQ_SHAPE)
+        self.coreq = self._intern(coreq, COREQ_SHAPE)
+        self.incompat = self._intern(incompat, INCOMPAT_SHAPE)
+        self._names = np.array(self.codes + [None], dtype=object)
+        self.required_closure, self.incompat_closure = self._closures()
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _intern(self, table, shape):
+        array = np.full((len(self.codes),) + shape, NO_COURSE, dtype=np.int32)
+        for code, rows in table.items():
+            for i, row in enumerate(rows):
+                for j, requisite in enumerate(row):
+                    if requisite is not None:
+                        array[self.ids[code], i, j] = self.ids[requisite]
+        array.setflags(write=False)
+        return array
+
+    def _closures(self):
+        """
+        For every course, find the ids of all courses it requires directly or through other
+        requisites, and the ids of the courses incompatible with it or with any of those.
+        """
+        required = [
+                frozenset(np.concatenate((self.prereq[i].ravel(), self.coreq[i].ravel()))) - {NO_COURSE}
+                for i in range(len(self.codes))
+                ]
+        required_closure = list()
+        incompat_closure = list()
+        for i in range(len(self.codes)):
+            reached = set()
+            worklist = list(required[i])
+            while worklist:
+                course = worklist.pop()
+                if course not in reached:
+                    reached.add(course)
+                    worklist.extend(required[course] - reached)
+            incompatible = set(self.incompat[i].ravel())
+            for course in reached:
+                incompatible.update(self.incompat[course].ravel())
+            incompatible.discard(NO_COURSE)
+            required_closure.append(frozenset(reached))
+            incompat_closure.append(frozenset(incompatible))
+        return required_closure, incompat_closure
+
+    def requisite_closure(self, codes):
+        """
+        Find every course required by some of the given courses, directly or transitively,
+        and every course incompatible with one of the given or required courses.
+
+        :param codes: Iterable of course codes.
+        :return: Tuple (set of required course codes, set of incompatible course codes).
+        """
+        ids = [self.ids[code] for code in codes]
+        required = frozenset().union(*(self.required_closure[i] for i in ids))
+        incompatible = frozenset().union(*(self.incompat_closure[i] for i in ids))
+        return {self.codes[i] for i in required}, {self.codes[i] for i in incompatible}
+
+    def cyclic_courses(self):
+        """Return the codes of the courses that require themselves through a cycle of requisites."""
+        return [code for i, code in enumerate(self.codes) if i in self.required_closure[i]]
+
+    def index(self, codes):
+        """Return the ids of an iterable of course codes as an int32 array."""
+        return np.array([self.ids[code] for code in codes], dtype=np.int32)
+
+    def decode(self, ids):
+        """Turn an array of ids into an object array of course codes, None for NO_COURSE."""
+        # NO_COURSE is -1, which picks the None at the end of _names.
+        return self._names[ids]
+
+    def views(self):
+        """Return dict-like views (prereq, coreq, incompat) of the requisite tables."""
+        return (RequisiteView(self, 'prereq'), RequisiteView(self, 'coreq'),
+                RequisiteView(self, 'incompat'))
+
+    def to_dicts(self):
+        """Return the requisite tables as dicts of course code: object array, as given to __init__."""
+        return tuple({code: view[code] for code in view} for view in self.views())
+
+
+class RequisiteView(Mapping):
+    """
+    Read-only dict of course code: array of requisite course codes padded with None,
+    reading from one table of a CourseCatalog.
+    """
+    def __init__(self, catalog, table):
+        self.catalog = catalog
+        self.table = getattr(catalog, table)
+        self.listed = catalog.listed[table]
+
+    def __getitem__(self, code):
+        if code not in self.listed:
+            raise KeyError(code)
+        return self.catalog.decode(self.table[self.catalog.ids[code]])
+
+    def __contains__(self, code):
+        return code in self.listed
+
+    def __iter__(self):
+        return iter(sorted(self.listed))
+
+    def __len__(self):
+        return len(self.listed)
@@ -0,0 +1,168 @@
+"""
+    Honour Project: ANU Study Planner
+"""
+
+"""
+    In this program, we compile the course pages crawled by crawler.py into
+    the course tables the model is built from: the semesters a course is
+    offered in (SEMESTER), its possible unit values (UNIT_TIME_SET), and its
+    prerequisites, corequisites and incompatible courses. The result is
+    written to a JSON catalog which data_process.load_catalog() reads.
+
+    Compiling is incremental: every course keeps a hash of the crawled data it
+    was compiled from, and a course whose data did not change is copied from
+    the previous catalog instead of being compiled again.
+
+    Usage:
+        python catalog_compiler.py catalog.jsonl --output catalog.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+
+from data_process import COURSE_REGEX
+
+CATALOG_FORMAT = 1
+# Only the two main semesters are modelled, summer/winter sessions are ignored.
+SEMESTER_NAMES = {
+    'First Semester': 'first',
+    'Second Semester': 'second',
+    }
+COREQ_WORDS = ('concurrently', 'co-requisite', 'corequisite')
+INCOMPAT_WORDS = ('incompatible',)
+
+
+def source_hash(course):
+    """Hash the parts of a crawled course that the compiled entry depends on."""
+    source = {
+        'offerings': course.get('offerings'),
+        'req_and_incompat': course.get('req_and_incompat'),
+        'time_unit': course.get('time_unit'),
+        }
+    return hashlib.sha256(json.dumps(source, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def compile_semesters(offerings):
+    """
+    Turn the output of PandCScraper.get_offerings_all() into the SEMESTER format, e.g.
+    ['odd_first', 'even_first', 'odd_first'] for a course offered in first semester of
+    2019, 2020 and 2021.
+
+    :return: List of semester names, or None if the page had no offerings.
+    """
+    if not offerings:
+        return None
+    semesters = list()
+    for yearname in sorted(offerings):
+        year = re.findall(r'\d{4}', yearname)
+        if not year:
+            continue
+        parity = 'odd' if int(year[0]) % 2 == 1 else 'even'
+        offered = [SEMESTER_NAMES[name] for name in SEMESTER_NAMES
+                   if any(name in semname for semname in offerings[yearname])]
+        for half in sorted(offered, key=['first', 'second'].index):
+            semesters.append('{}_{}'.format(parity, half))
+    return semesters
+
+
+def parse_requisites(text):
+    """
+    Extract requisites from the output of PandCScraper.get_req_and_incomp().
+
+    Parts of a sentence joined by "and" (or ";") are separate prerequisite clauses, and
+    courses joined by "or" inside a part are alternatives. Once a sentence mentions
+    concurrent enrolment or incompatibility, the codes that follow in that sentence are
+    corequisites or incompatible courses instead.
+
+    :return: Tuple (prerequisite clauses as a list of lists of codes, corequisite codes,
+    incompatible codes).
+    """
+    prereq_clauses = list()
+    coreqs = list()
+    incompats = list()
+    for sentence in re.split(r'(?<=\.)\s+', text or ''):
+        target = prereq_clauses
+        for part in re.split(r',?\s+and\s+|;', sentence):
+            lower = part.lower()
+            if any(word in lower for word in INCOMPAT_WORDS):
+                target = incompats
+            elif any(word in lower for word in COREQ_WORDS):
+                target = coreqs
+            codes = re.findall(COURSE_REGEX, part)
+            if not codes:
+                continue
+            if target is prereq_clauses:
+                prereq_clauses.append(codes)
+            else:
+                target.extend(code for code in codes if code not in target)
+    return prereq_clauses, coreqs, incompats
+
+
+def compile_course(course):
+    """Compile one crawled course into a catalog entry."""
+    prereq_clauses, coreqs, incompats = parse_requisites(course.get('req_and_incompat'))
+    return {
+        'source_hash': source_hash(course),
+        'semester': compile_semesters(course.get('offerings')),
+        'time_unit': course.get('time_unit'),
+        'prereq': prereq_clauses,
+        'coreq': coreqs,
+        'incompat': incompats,
+        }
+
+
+def compile_catalog(courses, previous=None):
+    """
+    Compile crawled courses into a catalog.
+
+    :param courses: Iterable of course dicts as written by crawler.py.
+    :param previous: The previous catalog, whose unchanged entries are reused.
+    :return: Tuple (catalog dict, number of courses that were compiled again).
+    """
+    previous_courses = (previous or {}).get('courses', {})
+    compiled = dict()
+    recompiled = 0
+    for course in courses:
+        code = course['code']
+        entry = previous_courses.get(code)
+        if entry is None or entry['source_hash'] != source_hash(course):
+            entry = compile_course(course)
+            recompiled = recompiled + 1
+        compiled[code] = entry
+    return {'format': CATALOG_FORMAT, 'courses': compiled}, recompiled
+
+
+def read_courses(path):
+    """Read the JSON-lines output of crawler.py."""
+    with open(path) as courses_file:
+        return [json.loads(line) for line in courses_file if line.strip()]
+
+
+def read_catalog(path):
+    """Read a compiled catalog, or return None if there is none at path yet."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as catalog_file:
+        catalog = json.load(catalog_file)
+    if catalog.get('format') != CATALOG_FORMAT:
+        return None
+    return catalog
+
+
+def write_catalog(catalog, path):
+    with open(path + '.tmp', 'w') as catalog_file:
+        json.dump(catalog, catalog_file, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compile crawled courses into a catalog.')
+    parser.add_argument('courses', help='JSON-lines file written by crawler.py')
+    parser.add_argument('--output', required=True, help='Catalog to create or update')
+    args = parser.parse_args()
+    catalog, recompiled = compile_catalog(read_courses(args.courses), read_catalog(args.output))
+    write_catalog(catalog, args.output)
+    print('{} courses, {} compiled again'.format(len(catalog['courses']), recompiled))
@@ -0,0 +1,145 @@
+"""
+    Honour Project: ANU Study Planner
+"""
+
+"""
+    In this program, we crawl the P&C pages of many courses at once with
+    PandCScraper. Courses are fetched and parsed by a pool of threads, with a
+    limit on how many requests start per second. Each course is appended to a
+    JSON-lines file as soon as it is done; the same file is the checkpoint, so
+    a crawl that stops half way resumes from where it was when restarted.
+
+    Usage:
+        python crawler.py --output catalog.jsonl [--year 2019] [COURSE_CODE ...]
+
+    Without course codes, the codes in COURSE_CODES and AVAILABLE_CODE are crawled.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import data_process as dp
+
+WORKERS = 8
+REQUESTS_PER_SECOND = 4.0
+
+
+class RateLimiter:
+    """
+    Let callers start at most `rate` actions per second, spaced evenly.
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_start = time.time()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.time()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def discover_course_codes():
+    """Course codes known to the scraper: those seen in program orders and those we model."""
+    return sorted(set(dp.COURSE_CODES) | set(dp.AVAILABLE_CODE))
+
+
+def read_checkpoint(output):
+    """
+    Find the courses already crawled into the output file.
+
+    A line cut short by an interrupted crawl is dropped from the file, so that new results
+    are appended after complete lines only.
+
+    :return: Set of course codes found in the file.
+    """
+    if not os.path.exists(output):
+        return set()
+    done = set()
+    good_lines = list()
+    damaged = False
+    with open(output) as output_file:
+        for line in output_file:
+            try:
+                done.add(json.loads(line)['code'])
+            except (ValueError, KeyError, TypeError):
+                damaged = True
+                continue
+            if not line.endswith('\n'):
+                line = line + '\n'
+                damaged = True
+            good_lines.append(line)
+    if damaged:
+        with open(output + '.tmp', 'w') as output_file:
+            output_file.writelines(good_lines)
+        os.replace(output + '.tmp', output)
+    return done
+
+
+def scrape_course(code, year=None):
+    """Scrape one course and return its get_course_dict() with its unit values added."""
+    scraper = dp.PandCScraper(code, year)
+    course = scraper.get_course_dict()
+    try:
+        course['time_unit'] = scraper.get_time_unit()
+    except (AttributeError, IndexError):
+        # Pages without an offerings block have no unit value to read.
+        course['time_unit'] = None
+    return course
+
+
+def crawl_courses(course_codes, output, year=None, workers=WORKERS, rate=REQUESTS_PER_SECOND):
+    """
+    Crawl courses into a JSON-lines file, one scrape_course() result per line.
+
+    :param course_codes: Iterable of course codes to crawl.
+    :param output: Path of the JSON-lines file, courses already in it are skipped.
+    :param year: Year of the P&C pages, the current P&C year if None.
+    :param workers: Number of courses fetched and parsed at the same time.
+    :param rate: Maximum number of courses started per second.
+    :return: Dict of course code: error message for the courses that failed.
+    """
+    done = read_checkpoint(output)
+    todo = [code for code in course_codes if code not in done]
+    limiter = RateLimiter(rate)
+    failed = dict()
+
+    def crawl(code):
+        limiter.wait()
+        return scrape_course(code, year)
+
+    with open(output, 'a') as output_file, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(crawl, code): code for code in todo}
+        for future in as_completed(futures):
+            code = futures[future]
+            try:
+                course = future.result()
+            except Exception as e:
+                failed[code] = str(e)
+                continue
+            # Results are written by this thread only, as soon as each one is ready.
+            output_file.write(json.dumps(course, sort_keys=True) + '\n')
+            output_file.flush()
+    return failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Crawl course pages from P&C into JSON lines.')
+    parser.add_argument('codes', nargs='*', help='Course codes, all known codes if none given')
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--year', default=None)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--rate', type=float, default=REQUESTS_PER_SECOND)
+    args = parser.parse_args()
+    failures = crawl_courses(args.codes or discover_course_codes(), args.output, args.year,
+                             args.workers, args.rate)
+    for failed_code, message in sorted(failures.items()):
+        sys.stderr.write('{}: {}\n'.format(failed_code, message))
@@ -23,8 +23,14 @@
     model.
 """
 
+import hashlib
+import json
+import os
 import re
 import collections
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 from itertools import chain
 from math import ceil
@@ -35,12 +41,17 @@ except:
     from urlparse import ParseResult, urlparse
 import numpy as np
 
-import requests
 from bs4 import BeautifulSoup
 from bs4.element import NavigableString
 
 from requests.exceptions import HTTPError
 
+import fetch
+from catalog import CourseCatalog, NO_COURSE
+from linear_model import LinearModel
+from model_writer import DATA_EXTENSIONS, ModelWriter, StaticModel, array_text, json_enum, json_set, set_text
+from presolve import NO_OF_SEMESTERS, pruned_requisites, semester_bounds, semester_name
+
 COURSE_REGEX = r'[A-Z]{4}\d{4}[A-Z]?'
 AREA_REGEX = r'[A-Z]{4}'
 LEVEL_REGEX = r'\d{4}'
@@ -66,6 +77,21 @@ QUALIFICATION = {
     '>=',
     '<=',
     }
+MZN_OPERATORS = {
+    'AND': '/\\',
+    'OR': '\\/',
+    }
+# Preference of a course the user did not rate, on the same 0..5 scale.
+DEFAULT_PREFERENCE = 3
+# max_load of general.mzn: units taken in every semester.
+MAX_LOAD = 4
+# The MiniZinc library every model includes, for each formulation: 'integer' gives every course
+# the semester it is taken in, 'binary' a 0/1 variable for each semester, which suits MIP
+# solvers better.
+FORMULATIONS = {
+    'integer': 'general.mzn',
+    'binary': 'binary.mzn',
+    }
 ORDER_LABEL = {
     'GLOBAL_BY_LEVEL': 'Global unit values required by level',
     'GLOBAL_BY COLLEGE': 'Global unit values required by College',
@@ -85,6 +111,10 @@ ORDER_LABEL = {
     'PROGRESSION': 'Progression depends on requirement text',
     'UNKNOWN_REQUIREMENT': 'Unknown requirement text'
     }
+# Subplan pages referenced by a program are fetched and parsed concurrently by
+# this many threads.
+SUBPLAN_FETCH_WORKERS = 8
+_subplan_pool = ThreadPoolExecutor(max_workers=SUBPLAN_FETCH_WORKERS)
 prereq = dict()
 coreq = dict()
 incompat = dict()
@@ -158,6 +188,12 @@ AVAILABLE_CODE = {'COMP8180', 'COMP8300', 'COMP6240', 'COMP6250', 'COMP7500', 'C
                   'COMP6363', 'COMP6330', 'COMP8420', 'COMP8501', 'COMP6261', 'ENGN8534',
                   'ENGN8832', 'ENGN6525', 'COMP6730', 'VCPG8002', 'ENGN8100', 'ENGN6601', 
                   'VCPG6100', 'COMP6340'}
+# Levels of the courses in AVAILABLE_CODE: a masters plan only takes 6000 to 9000 level courses.
+AVAILABLE_LEVELS = {'6', '7', '8', '9'}
+
+# Requests and jobs add course codes to COURSE_CODES and AVAILABLE_CODE from several
+# threads; they are only changed, and copied, while holding this lock.
+course_codes_lock = threading.Lock()
 
 # This array is obtained by the scraper.
 UNIT_TIME_SET = {'COMP8620': [1], 'VCPG6004': [1], 'COMP6720': [1], 'COMP8701': [1], 
@@ -389,6 +425,75 @@ incompat['ENGN6601'] = np.array([['ENGN3601', None, None]])
 prereq['VCPG6100'] = np.array([['VCPG6004', None, None], [None, None, None], [None, None, None]])
 incompat['COMP6340'] = np.array([['COMP2410', None, None]])
 
+# Intern the tables above into one read-only catalog shared by all requests;
+# prereq, coreq and incompat stay available as read-only dict views of it.
+CATALOG = CourseCatalog(prereq, coreq, incompat)
+prereq, coreq, incompat = CATALOG.views()
+# Names the course data in use, so cached models can tell catalogs apart: 'recorded' for the
+# tables above, a digest of the catalogs loaded on top of them otherwise.
+CATALOG_DIGEST = 'recorded'
+
+
+def _requisite_array(rows, length, width):
+    """Fit lists of course codes into a length x width array padded with None, as above."""
+    array = np.full((length, width), None, dtype=object)
+    for i, row in enumerate(rows[:length]):
+        for j, code in enumerate(row[:width]):
+            array[i][j] = code
+    return array
+
+
+def load_catalog(path):
+    """
+    Update the course tables above with a catalog compiled by catalog_compiler.py.
+
+    Courses in the catalog at the levels in AVAILABLE_LEVELS become available, and the
+    semesters, unit values and requisites of every course in it replace the recorded ones;
+    other courses keep what is recorded above. Courses at other levels, which the crawler
+    also fetches, can only ever enter a model as requisites.
+    Requisite lists longer than the model allows (3 clauses of 3 courses, 1 corequisite,
+    3 incompatible courses) are cut short.
+
+    :param path: Path of the catalog JSON file.
+    """
+    global CATALOG, CATALOG_DIGEST, prereq, coreq, incompat
+    with open(path, 'rb') as catalog_file:
+        content = catalog_file.read()
+    courses = json.loads(content.decode('utf-8'))['courses']
+    new_prereq, new_coreq, new_incompat = CATALOG.to_dicts()
+    required = set()
+    with course_codes_lock:
+        AVAILABLE_CODE.update(code for code in courses
+                              if re.fullmatch(COURSE_REGEX, code) and code[4] in AVAILABLE_LEVELS)
+    for code, course in courses.items():
+        if course['semester'] is not None:
+            SEMESTER[code] = list(course['semester'])
+        if course['time_unit']:
+            UNIT_TIME_SET[code] = list(course['time_unit'])
+        new_prereq[code] = _requisite_array(course['prereq'], 3, 3)
+        new_coreq[code] = _requisite_array([course['coreq']], 1, 1)
+        new_incompat[code] = _requisite_array([course['incompat']], 1, 3)
+        required.update(chain.from_iterable(course['prereq'][:3]))
+        required.update(course['coreq'][:1])
+    # Requisites are added to a model with the course requiring them, so each of them
+    # needs entries too, even if it was not crawled.
+    for code in required | set(courses):
+        SEMESTER.setdefault(code, [])
+        UNIT_TIME_SET.setdefault(code, [1])
+        new_prereq.setdefault(code, _requisite_array([], 3, 3))
+        new_coreq.setdefault(code, _requisite_array([], 1, 1))
+        new_incompat.setdefault(code, _requisite_array([], 1, 3))
+    # Requests already running keep the catalog they started with.
+    CATALOG = CourseCatalog(new_prereq, new_coreq, new_incompat)
+    prereq, coreq, incompat = CATALOG.views()
+    CATALOG_DIGEST = hashlib.sha256(CATALOG_DIGEST.encode('utf-8') + content).hexdigest()
+
+
+# Set PLANNER_CATALOG to the path of a compiled catalog to use it instead of the
+# recorded tables alone.
+if os.environ.get('PLANNER_CATALOG'):
+    load_catalog(os.environ['PLANNER_CATALOG'])
+
 class ReqNode:
     """
     Represent a paragraph in a set of Program Orders on a Programs and Courses page.
@@ -747,7 +852,14 @@ class CourseListFilter(CourseFilter):
 #        super().__init__()
         self.course_codes = course_codes
         # Hack automatic collection of seen course codes
-        COURSE_CODES.update(set(course_codes))
+        with course_codes_lock:
+            COURSE_CODES.update(set(course_codes))
+
+    def __setstate__(self, state):
+        # Filters loaded from a cache skip __init__, so collect their course codes here too.
+        self.__dict__.update(state)
+        with course_codes_lock:
+            COURSE_CODES.update(set(self.course_codes))
 
     def __repr__(self):
         return str(self.get_courses())
@@ -782,6 +894,72 @@ def build_course_regex(area_codes=None, levels=None):
     return r'{}{}[A-Z]?'.format(area_prefix, level_suffix)
 
 
+@functools.lru_cache(maxsize=256)
+def compile_course_regex(course_regex):
+    """Compile a course regex once, however many filters and courses use it."""
+    return re.compile(course_regex)
+
+
+def course_level(code):
+    """Return the level digit of a course code, e.g. '8' for 'COMP8260', or None."""
+    if re.fullmatch(COURSE_REGEX, code):
+        return code[4]
+    return None
+
+
+class CourseIndex:
+    """
+    Course codes grouped by area code and by level digit, so that expanding an area or level
+    filter is a dict lookup. Each group keeps the order in which the codes were given.
+    Results of arbitrary regex filters are remembered too.
+    """
+    def __init__(self, course_codes):
+        self.course_codes = list(course_codes)
+        self.areas = collections.defaultdict(list)
+        self.levels = collections.defaultdict(list)
+        for code in self.course_codes:
+            level = course_level(code)
+            if level is not None:
+                self.areas[code[:4]].append(code)
+                self.levels[level].append(code)
+        self.matches = dict()
+
+    def __len__(self):
+        return len(self.course_codes)
+
+    def area(self, area_code):
+        """Codes in an area, e.g. 'COMP'."""
+        return list(self.areas.get(area_code, ()))
+
+    def level(self, level):
+        """Codes of a level digit, e.g. '8'."""
+        return list(self.levels.get(level, ()))
+
+    def matching(self, course_regex):
+        """Codes that match course_regex from their start, like re.match."""
+        if course_regex not in self.matches:
+            pattern = compile_course_regex(course_regex)
+            self.matches[course_regex] = [code for code in self.course_codes if pattern.match(code)]
+        return list(self.matches[course_regex])
+
+
+_course_indexes = dict()
+
+
+def course_index(course_codes):
+    """
+    Return a CourseIndex of AVAILABLE_CODE or COURSE_CODES. Codes are only ever added to these
+    sets, so the index is built again only when its set has grown. It is built from a copy of
+    the set taken under course_codes_lock, as other threads may add codes meanwhile.
+    """
+    with course_codes_lock:
+        index = _course_indexes.get(id(course_codes))
+        if index is None or len(index) != len(course_codes):
+            index = CourseIndex(list(course_codes))
+            _course_indexes[id(course_codes)] = index
+        return index
+
+
 class CourseRegexFilter(CourseFilter):
     """Return a list of courses identified by a regular expression."""
     def __init__(self, course_regex):
@@ -800,7 +978,317 @@ class CourseRegexFilter(CourseFilter):
         """
         if course_codes is None:
             course_codes = COURSE_CODES
-        return [code for code in course_codes if re.match(self.course_regex, code)]
+        if course_codes is COURSE_CODES or course_codes is AVAILABLE_CODE:
+            return course_index(course_codes).matching(self.course_regex)
+        pattern = compile_course_regex(self.course_regex)
+        return [code for code in course_codes if pattern.match(code)]
+
+
+class RequirementGroup:
+    """
+    Requirements joined by a logical AND or OR.
+    """
+    def __init__(self, operator, children=None):
+        self.operator = operator
+        self.children = children or list()
+
+    def __repr__(self):
+        return 'RequirementGroup({}, {})'.format(self.operator, self.children)
+
+
+class UnitRequirement:
+    """
+    A unit value compared by operator ('==', '>=' or '<=') with the units taken from either
+    a list of course codes, every available course of an area, or, if both are None, the
+    requirements that follow it in its group. A requirement of the last kind with a non-zero
+    unit value qualifies its group and may carry a LevelRequirement.
+    """
+    def __init__(self, operator, units, courses=None, area=None):
+        """
+        :param operator: One of QUALIFICATION.
+        :param units: Unit value of the requirement.
+        :param courses: Optional list of course codes.
+        :param area: Optional area code e.g. 'COMP'.
+        """
+        self.operator = operator
+        self.units = int(units)
+        self.courses = courses
+        self.area = area
+        # Set by number_requirements(): the position of this requirement in the program, which
+        # names its course list in the model (list<number>), and for a qualification the last
+        # number it applies to.
+        self.number = None
+        self.scope_end = None
+        self.level = None
+
+    def __repr__(self):
+        return 'UnitRequirement({}{}, {})'.format(self.operator, self.units, self.courses or self.area)
+
+    @property
+    def is_qualification(self):
+        return self.courses is None and self.area is None and not self.is_placeholder
+
+    @property
+    def is_placeholder(self):
+        """A requirement of exactly 0 units, which asks for nothing."""
+        return self.operator == '==' and self.units == 0
+
+
+class LevelRequirement:
+    """
+    A unit value from courses of one level (e.g. '8' for 8000 level courses), applying to the
+    courses qualified by the UnitRequirement before it.
+    """
+    def __init__(self, operator, units, level):
+        self.operator = operator
+        self.units = int(units)
+        self.level = level
+
+    def __repr__(self):
+        return 'LevelRequirement({}{}, {}000 level)'.format(self.operator, self.units, self.level)
+
+
+def number_requirements(root):
+    """
+    Number the UnitRequirements of a requirement tree in order from 1, attach every
+    LevelRequirement to the qualification before it, and let every qualification apply to
+    the requirements after it up to the end of its group.
+
+    :param root: A RequirementGroup.
+    :return: List of the UnitRequirements in order, requirement n at index n - 1.
+    """
+    numbered = list()
+
+    def visit(node):
+        if isinstance(node, RequirementGroup):
+            qualifications = list()
+            for child in node.children:
+                if isinstance(child, UnitRequirement) and child.is_qualification:
+                    qualifications.append(child)
+                visit(child)
+            for qualification in qualifications:
+                qualification.scope_end = len(numbered)
+        elif isinstance(node, UnitRequirement):
+            node.number = len(numbered) + 1
+            numbered.append(node)
+        elif numbered and numbered[-1].is_qualification:
+            numbered[-1].level = node
+
+    visit(root)
+    return numbered
+
+
+def unit_sum(numbered, qualification):
+    """The MiniZinc sum of the units of the course lists a qualification applies to."""
+    return ' + '.join(
+            'unit_sum(list{})'.format(requirement.number)
+            for requirement in numbered[qualification.number:qualification.scope_end]
+            if requirement.units != 0 and not requirement.is_qualification
+            )
+
+
+def requirement_tokens(node, numbered, last_node):
+    """
+    Translate a requirement tree into the tokens of a MiniZinc constraint.
+
+    :param node: A RequirementGroup or UnitRequirement numbered by number_requirements().
+    :param numbered: The list returned by number_requirements().
+    :param last_node: Number of the last requirement that is not a qualification.
+    :return: List of tokens, to be joined by spaces.
+    """
+    if isinstance(node, RequirementGroup):
+        members = [child for child in node.children if isinstance(child, UnitRequirement)
+                   or isinstance(child, RequirementGroup)]
+        tokens = ['(']
+        for i, child in enumerate(members):
+            tokens.extend(requirement_tokens(child, numbered, last_node))
+            if i < len(members) - 1:
+                # A qualification always joins what follows it with an AND.
+                if isinstance(child, UnitRequirement) and child.is_qualification:
+                    tokens.append(MZN_OPERATORS['AND'])
+                else:
+                    tokens.append(MZN_OPERATORS.get(node.operator, node.operator))
+        tokens.append(')')
+        return tokens
+
+    if not node.is_qualification:
+        if '>' in node.operator:
+            symbol = 1
+        elif '<' in node.operator:
+            symbol = -1
+        else:
+            symbol = 0
+        return ['requirement_node(takes, list{}, {}, {})'.format(node.number, symbol, int(node.units/6))]
+
+    constraint = '{} >= {}'.format(unit_sum(numbered, node), int(node.units/6))
+    if node.level is not None:
+        lists = list()
+        for requirement in numbered[node.number:node.scope_end]:
+            if requirement.number == last_node:
+                break
+            if not requirement.is_qualification:
+                lists.append('array2set(list{})'.format(requirement.number))
+        # The model only has a level8 array, which every level requirement uses.
+        constraint = '{} /\\ level_criteria(takes, ({}), level8, {})'.format(
+                constraint, ' union '.join(lists), int(node.level.units/6))
+    return [constraint]
+
+
+def _unit_rows(linear, met, courses, signal, req_unit):
+    """
+    Add the rows of requirement_node() for a list of courses to a LinearModel, holding only
+    when the variable met is 1.
+    """
+    most = linear.max_units(courses)
+    if signal != -1:
+        terms = linear.unit_terms(courses)
+        terms[met] = -req_unit
+        linear.add_row(terms, '>=', 0)
+    if signal != 1:
+        terms = linear.unit_terms(courses)
+        terms[met] = most - req_unit
+        linear.add_row(terms, '<=', most)
+
+
+def requirement_rows(linear, node, numbered, last_node, lists, level8):
+    """
+    Add a requirement tree to a LinearModel as rows meaning the same as the constraint written
+    by requirement_tokens(). Every requirement and group gets a 0/1 variable which can only be
+    1 if it is met.
+
+    :param linear: A LinearModel.
+    :param node: A RequirementGroup or UnitRequirement numbered by number_requirements().
+    :param numbered: The list returned by number_requirements().
+    :param last_node: Number of the last requirement that is not a qualification.
+    :param lists: Dict of requirement number: list of its course codes.
+    :param level8: List of the grad courses of level 8.
+    :return: The name of the variable of node.
+    """
+    met = linear.add_variable('met_' + str(len(linear.variables)))
+    if isinstance(node, RequirementGroup):
+        members = [child for child in node.children if isinstance(child, UnitRequirement)
+                   or isinstance(child, RequirementGroup)]
+        # In MiniZinc /\ binds tighter than \/, and a qualification always joins what follows
+        # it with an AND, so a group is met when one run of members joined by ANDs is met.
+        runs = [list()]
+        for i, child in enumerate(members):
+            runs[-1].append(requirement_rows(linear, child, numbered, last_node, lists, level8))
+            qualifies = isinstance(child, UnitRequirement) and child.is_qualification
+            if i < len(members) - 1 and node.operator == 'OR' and not qualifies:
+                runs.append(list())
+        if len(runs) == 1:
+            for member in runs[0]:
+                linear.add_row({met: 1, member: -1}, '<=', 0)
+            return met
+        alternatives = dict()
+        for run in runs:
+            if len(run) == 1:
+                alternatives[run[0]] = -1
+                continue
+            conjunction = linear.add_variable('met_' + str(len(linear.variables)))
+            for member in run:
+                linear.add_row({conjunction: 1, member: -1}, '<=', 0)
+            alternatives[conjunction] = -1
+        alternatives[met] = 1
+        linear.add_row(alternatives, '<=', 0)
+        return met
+
+    if not node.is_qualification:
+        if '>' in node.operator:
+            signal = 1
+        elif '<' in node.operator:
+            signal = -1
+        else:
+            signal = 0
+        _unit_rows(linear, met, lists.get(node.number, []), signal, int(node.units/6))
+        return met
+
+    scope = [requirement for requirement in numbered[node.number:node.scope_end]
+             if requirement.units != 0 and not requirement.is_qualification]
+    _unit_rows(linear, met, [c for requirement in scope for c in lists.get(requirement.number, [])],
+               1, int(node.units/6))
+    if node.level is not None:
+        listed = set()
+        for requirement in numbered[node.number:node.scope_end]:
+            if requirement.number == last_node:
+                break
+            if not requirement.is_qualification:
+                listed.update(lists.get(requirement.number, []))
+        _unit_rows(linear, met, [c for c in level8 if c in listed], 1, int(node.level.units/6))
+    return met
+
+
+def identify_ai_specialisation(node):
+    """
+    Due to the different layout in the Artificial Intelligence Specialisation which cannot be
+    recognized by our scraper, we simply provide its requirements by hand: wherever a group of
+    >=24 units followed by four requirements for 0 units turns up, it becomes 24 units from
+    the AI courses.
+    """
+    if not isinstance(node, RequirementGroup):
+        return
+    unidentified = [('>=', 24)] + [('==', 0)] * 4
+    found = [
+            (child.operator, child.units) for child in node.children
+            if isinstance(child, UnitRequirement) and child.courses is None and child.area is None
+            ]
+    if node.operator == 'AND' and len(node.children) == len(unidentified) and found == unidentified:
+        node.children = [
+                UnitRequirement('==', 24),
+                UnitRequirement('==', 24, courses=['COMP6262', 'COMP6320', 'COMP8620', 'COMP8691']),
+                ]
+        return
+    for child in node.children:
+        identify_ai_specialisation(child)
+
+
+def preference_array(grad_courses, known_preference):
+    """
+    Scale the preferences of the user (0 to 1) to integers and list them in the order of
+    grad_courses, with DEFAULT_PREFERENCE for the courses the user did not rate.
+    """
+    return [int(float(known_preference[c])*5) if c in known_preference else DEFAULT_PREFERENCE
+            for c in grad_courses]
+
+
+def old_plan_array(grad_courses, oldPlan, replaced_course):
+    """
+    List the semester of every grad course in the old plan, -1 for a replaced course and 0
+    for a course that is not in the old plan.
+    """
+    replaced_course = set(replaced_course)
+    return [-1 if c in replaced_course else oldPlan.get(c, 0) for c in grad_courses]
+
+
+class ModelCourses:
+    """
+    The courses a model of a program is about, as collected by ProgramOrder.collect_courses().
+    """
+    def __init__(self, requirements, numbered, grad_courses, undergrad_courses, list_arrays, level8,
+                 requisites, bounds=None, dropped=None):
+        """
+        :param requirements: The requirement tree, see ProgramOrder.build_requirements().
+        :param numbered: Its UnitRequirements, see number_requirements().
+        :param grad_courses: List of the courses that may be taken.
+        :param undergrad_courses: List of the courses that must not be taken.
+        :param list_arrays: List of tuples (requirement number, list of its course codes).
+        :param level8: List of the grad courses of level 8.
+        :param requisites: List of tuples (name, object array of course codes or None) of the
+        prerequisites, corequisites and incompatible courses of the grad courses, in the
+        shapes of the catalog.
+        :param bounds: Dict of course code: (earliest, latest) semester if presolved, see
+        presolve.semester_bounds().
+        :param dropped: List of the grad courses presolve left out as they can never be taken.
+        """
+        self.requirements = requirements
+        self.numbered = numbered
+        self.grad_courses = grad_courses
+        self.undergrad_courses = undergrad_courses
+        self.list_arrays = list_arrays
+        self.level8 = level8
+        self.requisites = requisites
+        self.bounds = bounds
+        self.dropped = dropped or list()
 
 
 class ProgramOrder:
@@ -899,490 +1387,465 @@ class ProgramOrder:
                 elif result.find('}')>0:   
                     return '{}{}units {}000level\n'.format(self.operator, self.unit_value, result[1 + result.find('}')])
         return '{}{}units {}\n'.format(self.operator, self.unit_value, self.course_filter)       
-        
 
-    def buildAModel(self, known_preference = {}, start_semester = 1, spec = 0, oldPlan = {}, replaced_course = []):
+    def build_requirements(self):
         """
-        We construct and write the model file and data file to minizinc in this function.
-        
-        :param known_preference: A dict defines how much the user prefer to take the course
-        :param start_semester: A string denotes in which year and semester the user starts  
-        :param spec: A string denotes the intended specialisation 
-        :param oldPlan: A dict that indicates the old plan generated from our planner with undesired courses labeled by -1
-        :param replaced_course: A list consist of undesired courses
+        Build the requirement tree of this ProgramOrder from its children: a RequirementGroup for
+        every container, a UnitRequirement or LevelRequirement for every specific requirement.
+
+        :return: The root of the tree, or None for a requirement that names no courses, area or
+        level that we know how to use.
         """
+        if self.children:
+            children = [order.build_requirements() for order in self.children]
+            return RequirementGroup(self.operator, [child for child in children if child is not None])
+        if self.operator not in QUALIFICATION:
+            return None
+        if self.course_filter is None:
+            return UnitRequirement(self.operator, self.unit_value)
+        result = str(self.course_filter)
+        if '[A-Z]?' in result:
+            # Either an area code or a level digit, see dump_requirements().
+            area = re.findall(AREA_REGEX, result)
+            if area:
+                return UnitRequirement(self.operator, self.unit_value, area=area[0])
+            if result.find('}') > 0 and result[1 + result.find('}')].isdigit():
+                return LevelRequirement(self.operator, self.unit_value, result[1 + result.find('}')])
+            return None
+        courses = re.findall(COURSE_REGEX, result)
+        if courses:
+            return UnitRequirement(self.operator, self.unit_value, courses=courses)
+        return None
         
-        courses = list()
-        content = self.dump_requirements()
-        
-        # Due to the different layout in the Aritificial Intelligence Specialisation 
-        # which cannot be recognized by our scraper, we simply provide the information
-        # by hand.
-        unidentified = '( >=24units None\n AND ==0units None\n AND ==0units None\n AND ==0units None\n AND ==0units None\n )'
-        identified = '( ==24units None\n AND ==24units [\'COMP6262\', \'COMP6320\', \'COMP8620\', \'COMP8691\']\n )'
-        content = content.replace(unidentified, identified)
+
+    def collect_courses(self, start_semester = 1, presolve = False):
+        """
+        We collect the courses a model of this program is about in this function: the courses of
+        every requirement, the grad courses with all courses they require, and their requisites.
+        Every formulation of the model is built from them.
+
+        :param start_semester: A string denotes in which year and semester the user starts
+        :param presolve: Leave out the courses that can never be taken, see presolve.py
+        :return: A ModelCourses
+        """
+        requirements = self.build_requirements()
+        identify_ai_specialisation(requirements)
+        numbered = number_requirements(requirements)
 
         grad_courses = list()
         undergrad_courses = list()
+        # Keep using the same catalog even if load_catalog() replaces it meanwhile.
+        catalog = CATALOG
     
-        content = content.split('\n')
-        new_content = []
-        qual = dict()
-        unit_qual =dict()
         levelgroup = dict()
         levelgroup['level8'] = list()
 
-        unit_req = list()
-        all_req = ''
-        preference = dict()
-        DEFAULT_PREFERENCE = 3
-        
-        general = 'include "general.mzn";\n\n'
-        var_init_mzn = ''
-        constraints_mzn = ''
-        solve_mzn = ''
-        dzn = ''
-        
-        # Extract the content obtained by scraper.
-        # Put them in a list if there are real courses instead of course sets.
-        # Add a list into the big list by searching matched courses through 
-        # available courses.
-        list_order = 0
-        for i in range(len(content)):
-            course_list = re.findall(COURSE_REGEX, str(content[i]))
-            area_list = re.findall(AREA_REGEX, str(content[i]))
-            if course_list:
-                courses.append(course_list)
-            elif 'level' in content[i]:
-                # A level qualification is a constraint on course level,
-                # so items in qualification dict do not show up in course lists.
-                level = str(re.findall(r'\d{4}', str(content[i]))[0][0])
-                
-                for j in QUALIFICATION:
-                    if j in content[i]:
-                        temp = str(content[i])
-                        loc = temp.find(j[-1])
-                        # Contents to be extracted are within length of 5.
-                        unit = re.findall(r'\d{1,3}', str(temp[loc:loc+5]))
-                        unit_qual[list_order] = str(unit[0])
-                        break
-                qual[list_order] = level
-                
-                continue
-            elif area_list:
-
-                # A area qualification is a constraint on course area ('COMP', 'ECON'),
-                # which will be replaced by a list of matched courses.
-
-                courses.append([area_list])
-                course_list = str(area_list[0])
-            elif 'None' in content[i]:
-
-                # If no courses exist, put a None in the list.
-
-                courses.append([None])
-                course_list = None
+        # The course list of every numbered requirement: course codes, an area code in a
+        # list standing for all its available courses, or None.
+        courses = list()
+        for requirement in numbered:
+            if requirement.courses is not None:
+                courses.append(list(requirement.courses))
+            elif requirement.area is not None:
+                courses.append([[requirement.area]])
             else:
-                continue
-            
-            # For each qualification, we extract out the unit (e.g. 6 units, 12 units) 
-            # and unit_req (e.g. >=96, ==36).
-            for j in QUALIFICATION:
-                if j in content[i]:
-                    temp = str(content[i])
-                    loc = temp.find(j[-1])
-                    unit = re.findall(r'\d{1,3}', str(temp[loc:loc+5]))
-                    unit_req.append(str(j)+str(unit[0]))
-                    break
-                
-            list_order = list_order + 1
-            # Numbering each course list by an ascending order.
-            new_content = content[i].replace(str(course_list), str(list_order))
-            # Replace words by numbers.
-            new_content = new_content.replace(str(unit_req[list_order-1]+'units'), ' ')
-            all_req = all_req + new_content
-        
-        # The last right bracket would be ignored so we add a new one here
-        all_req = all_req + ' )'        
-    
-        # Remove extra space
-        sep_req = all_req.split(' ')
-        while '' in sep_req:
-            sep_req.remove('')
-            
-        # Record qualification location
-        qual_loc = list()
-        for i in range(len(courses)):
-            if not courses[i][0] and unit_req[i] != '==0':
-            # it means that it is not a list of courses but a qualification
-                for x in range(len(sep_req)):
-                    if not sep_req[x] in {'AND', 'OR', '(', ')', ':'} and int(sep_req[x]) == i + 1:
-                        sep_req[x+1] = ':'
-                        qual_loc.append(x+1)
-                        break
-                
-        # match the right bracket for the left bracket located at (index(:)-2)
-        # -> get the range of the qualification
-        bracket_list = list()
-        qual_range = dict()
-        for i in range(len(qual_loc)):
-            bracket_list.append('(')
-            pos = qual_loc[i]
-            lst_num = 0
-            while len(bracket_list) != 0:
-                pos = pos + 1
-                if sep_req[pos] == ')':
-                    bracket_list.pop()
-                elif sep_req[pos] == '(':
-                    bracket_list.append('(')
-                elif (not sep_req[pos] == 'AND') and (not sep_req[pos] == 'OR'):
-                    lst_num = sep_req[pos]
-            qual_range[int(sep_req[qual_loc[i]-1])] = [int(sep_req[qual_loc[i]+1]), int(lst_num)]
-            
-        # Sort this array qual_range in an ascending order for the purpose of selecting 
-        # it correctly when users click on different specialisations.
-        qual_range = collections.OrderedDict(sorted(qual_range.items()))
-        
-        # Clear all non-requirement nodes out from the requirement list.
-        while ':' in sep_req:
-            loc = None
-            for i in range(len(sep_req)):
-                if sep_req[i] == ':':
-                    loc = i
-                    break
-            sep_req[loc] = 'AND'
-                
-        nodes = list()
-        # Collect all course list number into the list - nodes.
-        for i in range(len(sep_req)):
-            if not sep_req[i] in {'AND', 'OR', '(', ')', ':'} and not int(sep_req[i]) in qual_range:
-                nodes.append(sep_req[i])
-        
-        # minizinc output - constraint that describes nodes in the requirement tree.
-        for i in range(len(sep_req)):
-            if not sep_req[i] in {'AND', 'OR', '(', ')', ':'}:
-                thisNode = ''
-                if int(sep_req[i]) in qual_range:
-                    flag = 1
-                    for j in range(qual_range[int(sep_req[i])][0], qual_range[int(sep_req[i])][1]+1):
-                        # Exclude those elements which are not course containers
-                        if int(unit_req[j-1][2:]) == 0 or j in qual_range:
-                            continue
-                        if flag:
-                            thisNode = 'unit_sum(list' + str(j) + ')'
-                            flag = 0
-                        else:
-                            thisNode = str(thisNode) + ' + ' + 'unit_sum(list' + str(j) + ')'
-                    thisNode = str(thisNode) + ' >= '+ str(int(int(unit_req[int(sep_req[i])-1][2:])/6))
-                if int(sep_req[i]) in qual:
-                    # Output level criteria in the requirement tree
-                    if thisNode:
-                        thisNode = thisNode + ' /\ '
-                    thisNode = thisNode + 'level_criteria(takes, ('
-                    flag = 1
-                    for k in range((int(qual_range[int(sep_req[i])][0]) - 1), int(qual_range[int(sep_req[i])][1]) + 1):
-                        if k == int(nodes[-1]):
-                            break
-                        if str(k) in nodes:
-                            if flag:
-                                thisNode = thisNode + 'array2set(list' + str(k) + ')'
-                                flag = 0
-                            else:
-                                thisNode = thisNode + ' union array2set(list' + str(k) + ')'
-                    thisNode = thisNode + '), level8, ' + str(int(int(unit_qual[int(sep_req[i])])/6)) + ')'
-                elif int(sep_req[i]) not in qual_range:
-                    # Output as requirement node when it is not a qualification
-                    symbol = unit_req[int(sep_req[i])-1][:2]
-                    unit = int(int(unit_req[int(sep_req[i])-1][2:])/6)
-                    if '>' in symbol:
-                        symbol = 1
-                    elif '<' in symbol:
-                        symbol = -1
-                    elif '==' in symbol:
-                        symbol = 0
-                    thisNode = 'requirement_node(takes, list' + str(sep_req[i]) + ', ' + str(symbol) + ', ' + str(unit) + ')'
-                sep_req[i] = thisNode
-                
-        # Translate 'and', 'or' to '/\' and '\/' (and, or in minizinc)
-        for i in range(len(sep_req)):
-            if sep_req[i] == 'AND':
-                sep_req[i] = r'/\\'[:-1]
-            elif sep_req[i] == 'OR':
-                sep_req[i] = r'\\/'[1:]
-        
-        count = 0
-        extra_requirement = list()
-        for q in qual_range:
-            temp = ''
-            flag = 1
-            if count == spec:
-                for i in range(qual_range[q][0], qual_range[q][1]+1):
-                    if int(unit_req[i-1][2:]) == 0 or i in qual_range:
-                        continue
-                    if flag:
-                        temp = str(temp) + 'unit_sum(list' + str(i) + ')'
-                        flag = 0
-                    else:
-                        temp = str(temp) + ' + ' + 'unit_sum(list' + str(i) + ')'
-            
-                temp = 'constraint (' + str(temp) + ' >= ' + str(int(int(unit_req[q-1][2:])/6)) + ');\n\n'
-            
-            count = count + 1
-            extra_requirement.append(temp)
-
-        for i in extra_requirement:
-            constraints_mzn = str(constraints_mzn) + str(i)
+                courses.append([None])
 
-        all_req = 'constraint '
-        for i in sep_req:
-            all_req = all_req + str(i) + ' '
-        constraints_mzn = constraints_mzn + all_req + ';\n\n'
-        constraints_mzn = constraints_mzn.replace(str(sep_req[-3] + ' ' + sep_req[-2]),'')
-        
         # Seperate courses in list into undergraduate courses and graduate courses.
         courses_inlist = list()
+        available = course_index(AVAILABLE_CODE)
         for li in courses:
             for c in li:
                 if c==None:
                     break
                 elif not isinstance(c, str):
                     for ins in c:
-                        for c1 in AVAILABLE_CODE:
-                            res = re.findall(build_course_regex(c[0], None), str(c1))
-                            if res != [] and not str(res[0]) in courses_inlist:
-                                courses_inlist.append(res[0])
-                                grad_courses.append(res[0])
+                        for c1 in available.area(c[0]):
+                            if c1 not in courses_inlist:
+                                courses_inlist.append(c1)
+                                grad_courses.append(c1)
                 elif isinstance(c, str):
                     if c not in courses_inlist:
                         courses_inlist.append(c)
                         grad_courses.append(c)
         
         # Include all involved courses(requisite and incompatible) into grad courses
-        # and undergrad courses.
-        while True:
-            # This flag will be set to 1 when there are some new courses added into
-            # either grad_courses or undergrad_courses; when there is an iteration
-            # where it remains 0, it means there is no courses added, so we end this
-            # loop.
-            flag = 0
-            for c in grad_courses:
-                for n1 in range(3):
-                    for n2 in range(3):
-                        if prereq[c][n1][n2] != None and prereq[c][n1][n2] not in grad_courses and prereq[c][n1][n2] not in undergrad_courses:
-                            # prerequisite courses always go to the grad_courses list as we are dealing with a grad degree.
-                            grad_courses.append(prereq[c][n1][n2])
-                            flag = 1
-                        if coreq[c][0][0] != None and coreq[c][0][0] not in grad_courses and coreq[c][0][0] not in undergrad_courses:
-                            # corequisite courses belong to grad_courses due to the same reason as prerequisite courses.
-                            grad_courses.append(coreq[c][0][0])
-                            flag = 1
-                for n in range(3):
-                    if incompat[c][0][n] != None and incompat[c][0][n] not in grad_courses and incompat[c][0][n] not in undergrad_courses:
-                        # incompatible courses are undergrad_courses.
-                        undergrad_courses.append(incompat[c][0][n])
-                        flag = 1
-            if flag == 0:
-                break
+        # and undergrad courses. Every course is expanded once, in the order it was
+        # added, and a course already placed in either list is never added again.
+        placed = set(grad_courses)
+        worklist = collections.deque(grad_courses)
+        while worklist:
+            c = catalog.ids[worklist.popleft()]
+            prerequisites = catalog.prereq[c].ravel()
+            # The corequisite goes right after the first prerequisite, where the
+            # original 3x3 scan used to pick it up.
+            for r in chain(prerequisites[:1], catalog.coreq[c].ravel(), prerequisites[1:]):
+                if r != NO_COURSE and catalog.codes[r] not in placed:
+                    # prerequisite and corequisite courses always go to the grad_courses list
+                    # as we are dealing with a grad degree.
+                    placed.add(catalog.codes[r])
+                    grad_courses.append(catalog.codes[r])
+                    worklist.append(catalog.codes[r])
+            for r in catalog.incompat[c].ravel():
+                if r != NO_COURSE and catalog.codes[r] not in placed:
+                    # incompatible courses are undergrad_courses.
+                    placed.add(catalog.codes[r])
+                    undergrad_courses.append(catalog.codes[r])
 
         # Collect all high-level courses
         for i in grad_courses:
-            if re.findall(build_course_regex(None, ['8']), i):
+            if course_level(i) == '8':
                 levelgroup['level8'].append(str(i))
-                
-        # Enter the array into MiniZincs
-        levelmzn = 'array[1..' + str(len(levelgroup['level8'])) + '] of courses: level8;\n\n'
-        leveldzn = 'level8 = ['
-        for i in levelgroup['level8']:
-            leveldzn = leveldzn + str(i)
-            if i != levelgroup['level8'][-1]:
-                leveldzn = leveldzn + ', '
-            else:
-                leveldzn = leveldzn + '];'
-
 
         # All courses in the list.
-        temp_courses = list()
+        listed_courses = set()
+        for course_list in courses:
+            if isinstance(course_list[0], str):
+                listed_courses.update(course_list)
+
+        # Construct course array as the sequence in the degree requirement: a list of
+        # courses, or a fake list denoted as an area code.
+        list_arrays = list()
         for i in range(len(courses)):
-            if isinstance(courses[i][0], str) and courses[i][0] != None:
-                for ii in range(len(courses[i])):
-                    temp_courses.append(courses[i][ii])
-        
-        # Output list into Minizinc.
-        if len(replaced_course) != 0:
-            var_init_mzn = var_init_mzn + 'array[grad_courses] of -1..4: old_plan;\n\n'
+            if isinstance(courses[i][0], str):
+                list_arrays.append((i + 1, courses[i]))
+            elif isinstance(courses[i][0], list):
+                area_courses = list()
+                for area in courses[i][0]:
+                    area_courses = [c1 for c1 in available.area(area) if c1 not in listed_courses]
+                list_arrays.append((i + 1, area_courses))
+
+        tables = (('prereq', catalog.prereq), ('corequisite', catalog.coreq), ('incompat', catalog.incompat))
+        bounds = None
+        dropped = list()
+        if presolve:
+            # Only courses that can be taken stay in the model. Undergrad courses are never
+            # taken, so incompatibilities with them are dropped along with the courses.
+            bounds = semester_bounds(catalog, grad_courses, SEMESTER, start_semester)
+            takeable = set(bounds)
+            dropped = [c for c in grad_courses if c not in takeable]
+            grad_courses = [c for c in grad_courses if c in takeable]
+            undergrad_courses = list()
+            list_arrays = [(number, [c for c in course_list if c in takeable])
+                           for number, course_list in list_arrays]
+            levelgroup['level8'] = [c for c in levelgroup['level8'] if c in takeable]
+            grad_ids = catalog.index(grad_courses)
+            requisites = [(name, pruned_requisites(catalog, table, grad_ids, grad_ids))
+                          for name, table in tables]
+        else:
+            grad_ids = catalog.index(grad_courses)
+            requisites = [(name, catalog.decode(table[grad_ids])) for name, table in tables]
 
-        var_init_mzn = var_init_mzn + 'array[grad_courses] of int: preference;\n\n'
+        return ModelCourses(requirements, numbered, grad_courses, undergrad_courses, list_arrays,
+                            levelgroup['level8'], requisites, bounds, dropped)
+
+    def build_static_model(self, start_semester = 1, spec = 0, refining = False, data_format = 'dzn',
+                           presolve = False, formulation = 'integer', warm_start = False):
+        """
+        We construct the parts of the model file and data file that are the same for every user
+        in this function: everything except the preference and old_plan arrays.
+
+        :param start_semester: A string denotes in which year and semester the user starts
+        :param spec: A string denotes the intended specialisation
+        :param refining: True to build a model that refines an old plan, False for a new plan
+        :param data_format: 'dzn' for a MiniZinc data file, or 'json' for the same data as
+        MiniZinc JSON
+        :param presolve: Leave out the courses that can never be taken, see presolve.py
+        :param formulation: One of FORMULATIONS, the MiniZinc library the model includes
+        :param warm_start: Start a refined plan from the old plan with a warm_start annotation,
+        which needs MiniZinc 2.5 or later
+        :return: A StaticModel
+        """
+
+        if data_format not in DATA_EXTENSIONS:
+            raise ValueError('Unknown data format {}, use one of {}'.format(
+                    data_format, ', '.join(sorted(DATA_EXTENSIONS))))
+        if formulation not in FORMULATIONS:
+            raise ValueError('Unknown formulation {}, use one of {}'.format(
+                    formulation, ', '.join(sorted(FORMULATIONS))))
+        binary = formulation == 'binary'
+
+        collected = self.collect_courses(start_semester, presolve)
+        requirements = collected.requirements
+        numbered = collected.numbered
+        grad_courses = collected.grad_courses
+        undergrad_courses = collected.undergrad_courses
+        list_arrays = collected.list_arrays
+        level8 = collected.level8
+        bounds = collected.bounds
+        requisites = [(name, values.ravel()) for name, values in collected.requisites]
+
+        general = 'include "' + FORMULATIONS[formulation] + '";\n\n'
+        constraints_mzn = ''
+        solve_mzn = ''
+
+        # The unit value a specialisation needs is added as an extra constraint, for the
+        # specialisation chosen by spec only. spec counts every qualification in order,
+        # starting with the program itself.
+        qualifications = [requirement for requirement in numbered if requirement.is_qualification]
+        for count, qualification in enumerate(qualifications):
+            if count == spec:
+                constraints_mzn = constraints_mzn + 'constraint (' + unit_sum(numbered, qualification) \
+                                  + ' >= ' + str(int(qualification.units/6)) + ');\n\n'
+
+        # The whole requirement tree becomes one constraint. Program pages end with a
+        # requirement for 0 units that asks for nothing, which is left out.
+        nodes = [requirement for requirement in numbered if not requirement.is_qualification]
+        last_node = nodes[-1].number if nodes else None
+        tokens = requirement_tokens(requirements, numbered, last_node)
+        members = [child for child in requirements.children if not isinstance(child, LevelRequirement)]
+        if len(members) > 1 and isinstance(members[-1], UnitRequirement) and members[-1].is_placeholder:
+            tokens = tokens[:-3] + ['', ')']
+        constraints_mzn = constraints_mzn + 'constraint ' + ' '.join(tokens) + ' ;\n\n'
+
+        # With warm_start, a refined plan starts from the old plan: the courses that are not
+        # replaced are handed to solvers that support warm starts (MIP solvers), the others
+        # ignore it. MiniZinc before 2.5 rejects the annotation, so it is left out by default.
+        # The binary formulation writes both objectives as linear sums over its 0/1
+        # variables: a course taken in semester s is abs(old_plan[c] - s) away from
+        # its old semester, and a course left out is old_plan[c] away.
+        if binary and refining:
+            solve_mzn = 'solve ' \
+                        + ('' if not warm_start else ':: warm_start([x[c, s] | c in grad_courses where old_plan[c] > 0, s in plan_semesters], [bool2int(old_plan[c] = s) | c in grad_courses where old_plan[c] > 0, s in plan_semesters]) ') \
+                        + 'minimize sum(c in grad_courses where old_plan[c] > 0)(old_plan[c] * (1 - taken[c]) + sum(s in plan_semesters)(abs(old_plan[c] - s) * x[c, s])) + sum(c in grad_courses where old_plan[c] == -1)(takes[c]);'
+        elif binary:
+            solve_mzn = 'solve maximize sum(c in grad_courses)(preference[c] * taken[c]);'
         # If we have some courses to be replaced, we are in the refining phase
-        if len(replaced_course) != 0:
-            solve_mzn = 'solve minimize sum(c in grad_courses where old_plan[c] > 0)(abs(old_plan[c]-takes[c])) + sum(c in grad_courses where old_plan[c] == -1)(abs(takes[c]));'
+        elif refining:
+            solve_mzn = 'solve ' \
+                        + ('' if not warm_start else ':: warm_start([takes[c] | c in grad_courses where old_plan[c] > 0], [old_plan[c] | c in grad_courses where old_plan[c] > 0]) ') \
+                        + 'minimize sum(c in grad_courses where old_plan[c] > 0)(abs(old_plan[c]-takes[c])) + sum(c in grad_courses where old_plan[c] == -1)(abs(takes[c]));'
         # otherwise we only need to maximize the sum of every preference value for courses in the plan
         else:
             solve_mzn = 'solve maximize sum(c in grad_courses where takes[c] != 0)(preference[c]);'
 
-        # if we are in the phase of refining a plan, the old plan will be a part of output            
-        if len(replaced_course) != 0:
+        # Combine grad courses and undergrad courses as one array
+        all_courses = grad_courses + ['None'] + undergrad_courses
+
+        # The data file is split around the preference array, which every request adds.
+        if data_format == 'dzn':
+            head = ModelWriter()
+            head.write('start_semester = ', str(start_semester), ';\n')
+            head.write('no_of_grad_courses = ', str(len(grad_courses)), ';\n\n')
+            data = ModelWriter()
+            data.array('courses = {', all_courses, close='};')
+            data.array('grad_courses = {', grad_courses, close='};')
+            data.array('undergrad_courses = {', ['None'] + undergrad_courses, close='};')
+            for number, course_list in list_arrays:
+                data.array('list' + str(number) + ' = [', course_list, end='\n')
+            data.array('level8 = [', level8)
+            for name, values in requisites:
+                data.array(name + ' = [', values)
+            data.set_array('time_unit_available = [', [UNIT_TIME_SET[c] for c in grad_courses])
+            data.set_array('offered_semester = [', [SEMESTER[c] for c in grad_courses])
+            if bounds is not None:
+                data.array('earliest_semester = [', [bounds[c][0] for c in grad_courses])
+                data.array('latest_semester = [', [bounds[c][1] for c in grad_courses])
+            head = head.getvalue()
+            body = data.getvalue()
+        else:
+            head = dict()
+            head['start_semester'] = int(start_semester)
+            head['no_of_grad_courses'] = len(grad_courses)
+            body = dict()
+            body['courses'] = json_enum(all_courses)
+            body['grad_courses'] = json_set(json_enum(grad_courses))
+            body['undergrad_courses'] = json_set(json_enum(['None'] + undergrad_courses))
+            for number, course_list in list_arrays:
+                body['list' + str(number)] = json_enum(course_list)
+            body['level8'] = json_enum(level8)
+            for name, requisite_codes in requisites:
+                body[name] = json_enum(requisite_codes)
+            body['time_unit_available'] = [json_set(UNIT_TIME_SET[c]) for c in grad_courses]
+            body['offered_semester'] = [json_set(json_enum(SEMESTER[c])) for c in grad_courses]
+            if bounds is not None:
+                body['earliest_semester'] = [bounds[c][0] for c in grad_courses]
+                body['latest_semester'] = [bounds[c][1] for c in grad_courses]
+
+        model = ModelWriter()
+        model.write(general)
+        if refining:
+            model.write('array[grad_courses] of -1..4: old_plan;\n\n')
+        model.write('array[grad_courses] of int: preference;\n\n')
+        for number, course_list in list_arrays:
+            model.write('array[1..', str(len(course_list)), '] of courses: list', str(number), ';\n')
+        model.write('\n\n', 'array[1..', str(len(level8)), '] of courses: level8;\n\n')
+        if bounds is not None:
+            # A course is either not taken, or taken between its earliest and latest semester.
+            model.write('array[grad_courses] of 1..no_of_semesters: earliest_semester;\n',
+                        'array[grad_courses] of 1..no_of_semesters: latest_semester;\n')
+            if binary:
+                model.write('constraint forall(c in grad_courses, s in plan_semesters where '
+                            's < earliest_semester[c] \\/ s > latest_semester[c])(x[c, s] = 0);\n\n')
+            else:
+                model.write('constraint forall(c in grad_courses)(takes[c] in {0} union '
+                            'earliest_semester[c]..latest_semester[c]);\n\n')
+        model.write(constraints_mzn, solve_mzn)
+
+        return StaticModel(model.getvalue(), grad_courses, refining, data_format, head, body,
+                           collected.dropped)
+
+    def build_linear_model(self, start_semester = 1, spec = 0, presolve = False):
+        """
+        We construct the binary formulation of the model as a linear program in this function, so
+        that CBC can solve it without MiniZinc, see linear_model.py. Like the static model it is
+        the same for every user; the objective and hard preferences of a request are added when
+        it is written.
+
+        :param start_semester: A string denotes in which year and semester the user starts
+        :param spec: A string denotes the intended specialisation
+        :param presolve: Leave out the courses that can never be taken, see presolve.py
+        :return: A LinearModel
+        """
+        collected = self.collect_courses(start_semester, presolve)
+        numbered = collected.numbered
+        grad_courses = collected.grad_courses
+        lists = dict(collected.list_arrays)
+        bounds = collected.bounds or dict()
+        linear = LinearModel(grad_courses, NO_OF_SEMESTERS, collected.dropped)
+
+        # A variable for every semester a course is offered in (and within its bounds), and every
+        # unit value it can count for. Undergrad courses get none, they are never taken.
+        for c in grad_courses:
+            earliest, latest = bounds.get(c, (1, NO_OF_SEMESTERS))
+            for taken in range(earliest, latest + 1):
+                if semester_name(start_semester, taken) in SEMESTER[c]:
+                    for units in sorted(UNIT_TIME_SET[c]):
+                        linear.add_course_slot(c, taken, units)
+
+        for c in grad_courses:
+            if len(linear.course_slots[c]) > 1:
+                linear.add_row(linear.taken_terms(c), '<=', 1)
+
+        requisites = dict(collected.requisites)
+        for i, c in enumerate(grad_courses):
+            taken = sorted({semester for _, semester, _ in linear.course_slots[c]})
+            # One course of every prerequisite clause is taken in an earlier semester.
+            for clause in requisites['prereq'][i]:
+                alternatives = [r for r in clause if r is not None]
+                for semester in taken if alternatives else []:
+                    terms = linear.taken_terms(c, [semester])
+                    for r in alternatives:
+                        terms.update({variable: -1 for variable in linear.taken_terms(r, range(1, semester))})
+                    linear.add_row(terms, '<=', 0)
+            # The corequisite is taken in the same semester or before.
+            for r in requisites['corequisite'][i].ravel():
+                for semester in taken if r is not None else []:
+                    terms = linear.taken_terms(c, [semester])
+                    terms.update({variable: -1 for variable in linear.taken_terms(r, range(1, semester + 1))})
+                    linear.add_row(terms, '<=', 0)
+            for r in requisites['incompat'][i].ravel():
+                if r is not None:
+                    terms = linear.taken_terms(c)
+                    for variable in linear.taken_terms(r):
+                        terms[variable] = terms.get(variable, 0) + 1
+                    linear.add_row(terms, '<=', 1)
+
+        for taken in range(1, NO_OF_SEMESTERS + 1):
+            linear.add_load_row(taken, MAX_LOAD)
+
+        # The unit value of the chosen specialisation, as in build_static_model().
+        qualifications = [requirement for requirement in numbered if requirement.is_qualification]
+        for count, qualification in enumerate(qualifications):
+            if count == spec:
+                scope = [requirement for requirement in numbered[qualification.number:qualification.scope_end]
+                         if requirement.units != 0 and not requirement.is_qualification]
+                courses = [c for requirement in scope for c in lists.get(requirement.number, [])]
+                linear.add_row(linear.unit_terms(courses), '>=', int(qualification.units/6), 'specialisation')
+
+        # The requirement tree, without the requirement for 0 units program pages end with.
+        requirements = collected.requirements
+        members = [child for child in requirements.children if not isinstance(child, LevelRequirement)]
+        if len(members) > 1 and isinstance(members[-1], UnitRequirement) and members[-1].is_placeholder:
+            requirements = RequirementGroup(requirements.operator,
+                                            [child for child in requirements.children if child is not members[-1]])
+        nodes = [requirement for requirement in numbered if not requirement.is_qualification]
+        last_node = nodes[-1].number if nodes else None
+        met = requirement_rows(linear, requirements, numbered, last_node, lists, collected.level8)
+        linear.add_row({met: 1}, '=', 1, 'requirements')
+        return linear
+
+    def buildAModel(self, known_preference = {}, start_semester = 1, spec = 0, oldPlan = {}, replaced_course = [],
+                    output_prefix = 'test1', mzn_sink = None, dzn_sink = None, data_format = 'dzn',
+                    presolve = False, formulation = 'integer', warm_start = False):
+        """
+        We construct the model file and data file to minizinc in this function.
+        
+        :param known_preference: A dict defines how much the user prefer to take the course
+        :param start_semester: A string denotes in which year and semester the user starts  
+        :param spec: A string denotes the intended specialisation 
+        :param oldPlan: A dict that indicates the old plan generated from our planner with undesired courses labeled by -1
+        :param replaced_course: A list consist of undesired courses
+        :param output_prefix: Write the model to <output_prefix>.mzn and <output_prefix>.dzn, or
+        nothing at all if it is None
+        :param mzn_sink: Optional file-like object to stream the model file to
+        :param dzn_sink: Optional file-like object to stream the data file to
+        :param data_format: 'dzn' for a MiniZinc data file, or 'json' for the same data as
+        MiniZinc JSON
+        :param presolve: Leave out the courses that can never be taken, see presolve.py
+        :param formulation: One of FORMULATIONS, the MiniZinc library the model includes
+        :param warm_start: Start a refined plan from the old plan, see build_static_model()
+        :return: A tuple (mzn, dzn) holding the text of the model and data files, or (None, None)
+        if they were streamed to sinks instead
+        """
+        
+        # If we have some courses to be replaced, we are in the refining phase
+        refining = len(replaced_course) != 0
+        static = self.build_static_model(start_semester, spec, refining, data_format, presolve,
+                                         formulation, warm_start)
+        grad_courses = static.grad_courses
+        preference = preference_array(grad_courses, known_preference)
+
+        # if we are in the phase of refining a plan, the old plan will be a part of output
+        old_plan = None
+        if refining:
             for i in replaced_course:
                 oldPlan[i] = -1
             for c in grad_courses:
                 if c not in oldPlan:
                     oldPlan[c] = 0
-            output_oldplan = self.pass_dict(grad_courses, oldPlan, 'old_plan = [')
-            dzn = dzn + output_oldplan + '\n\n'
-        
-        dzn = dzn + 'start_semester = ' + str(start_semester) + ';\n'
-        dzn = dzn + 'no_of_grad_courses = ' + str(len(grad_courses)) + ';\n\n'
-        
-        for c in grad_courses:
-            if c not in known_preference:
-                preference[c] = DEFAULT_PREFERENCE
-            else:
-                preference[c] = int(float(known_preference[c])*5)
-        output_preference = self.pass_dict(grad_courses, preference, 'preference = [')
-        
-        dzn = dzn + output_preference + '\n\n'
-        
-        # Combine grad courses and undergrad courses as one array
-        all_courses = grad_courses.copy()
-        all_courses.append('None')
-        all_courses = all_courses + undergrad_courses
-        
-        # Reconstructure into MiniZinc
-        enum_courses_output = self.pass_enum_or_array(all_courses, 'enum', None, None, 'courses = {')
-        enum_grad_courses_output = self.pass_enum_or_array(grad_courses, 'enum', None, None, 'grad_courses = {')
-        enum_undergrad_courses_output = self.pass_enum_or_array(undergrad_courses, 'enum', None, None, 'undergrad_courses = {None, ')
-        arrayprereq = self.pass_nparray(grad_courses, 3, 3, prereq, 'prereq = [')
-        arraycoreq = self.pass_nparray(grad_courses, 1, 1, coreq, 'corequisite = [')
-        arrayincompat = self.pass_nparray(grad_courses, 1, 3, incompat, 'incompat = [')
-        timeunitavailable = self.pass_enum_or_array(grad_courses, 'array', UNIT_TIME_SET, 'set', 'time_unit_available = [')
-        offered_semester = self.pass_enum_or_array(grad_courses, 'array', SEMESTER, 'set', 'offered_semester = [')
-        dzn = dzn + str(enum_courses_output) + '\n\n' + str(enum_grad_courses_output) + '\n\n' + str(enum_undergrad_courses_output) + '\n\n'
-
-        # Construct course array as the sequence in the degree requirement
-        for i in range(len(courses)):
-            # if it is a list of courses
-            if isinstance(courses[i][0], str) and courses[i][0] != None:
-                str_list = 'list' + str(i+1) + ' = ['
-                list_len = len(courses[i])
-                for ii in range(len(courses[i])):
-                    if ii == len(courses[i]) - 1:
-                        str_list = str_list + courses[i][ii] + '];'
-                        break
-                    str_list = str_list + courses[i][ii] + ', '
-                dzn = dzn + str(str_list) + '\n'
-                var_init_mzn = var_init_mzn + str('array[1..' + str(list_len) + '] of courses: list' + str(i+1) + ';\n')
-            # if it is a fake list denoted as a area code 
-            elif isinstance(courses[i][0], list):
-                str_list = 'list' + str(i+1) + ' = ['
-                list_len = 0
-                for ii in range(len(courses[i])):
-                    temp = list()
-                    for c1 in AVAILABLE_CODE:
-                        res = re.findall(build_course_regex(courses[i][0][ii], None), str(c1))
-                        if len(res) !=0 and not res[0] in temp_courses:
-                            temp.append(res[0])
-                    list_len = len(temp)
-                    for ti in range(len(temp)):
-                        if ti == len(temp) - 1:
-                            str_list = str_list + temp[ti] + '];'
-                            break
-                        str_list = str_list + temp[ti] + ', '
-                dzn = dzn + str(str_list) + '\n'
-                var_init_mzn = var_init_mzn + str('array[1..' + str(list_len) + '] of courses: list' + str(i+1) + ';\n')
-            
-        dzn = dzn + str(leveldzn) + '\n\n'
-        dzn = dzn + str(arrayprereq) + '\n\n'
-        dzn = dzn + str(arraycoreq) + '\n\n'
-        dzn = dzn + str(arrayincompat) + '\n\n'      
-        dzn = dzn + str(timeunitavailable) + '\n\n'   
-        dzn = dzn + str(offered_semester) + '\n\n'
-        
-        var_init_mzn = var_init_mzn + '\n\n' + levelmzn
-        mzn = str(general) + str(var_init_mzn) + str(constraints_mzn) + str(solve_mzn)
-        file_object = open('test1.mzn', 'w')
-#        file_object = open('experiments/test.mzn', 'w')
-        file_object.write(mzn)
-        file_object.close( )
-        
-        file_object = open('test1.dzn', 'w')
-#        file_object = open('experiments/test.dzn', 'w')
-        file_object.write(dzn)
-        file_object.close()
+            old_plan = old_plan_array(grad_courses, oldPlan, replaced_course)
+
+        data = static.write_data(dzn_sink, preference, old_plan)
+        model = ModelWriter(mzn_sink)
+        model.write(static.mzn)
+
+        if mzn_sink is not None or dzn_sink is not None:
+            return None, None
+        mzn = model.getvalue()
+        dzn = data.getvalue()
+
+        # Only write the model out when asked to, so that concurrent requests can
+        # keep their own model text in memory instead of sharing test1.mzn/test1.dzn.
+        if output_prefix is not None:
+            file_object = open(str(output_prefix) + '.mzn', 'w')
+#            file_object = open('experiments/test.mzn', 'w')
+            file_object.write(mzn)
+            file_object.close( )
+
+            file_object = open(str(output_prefix) + DATA_EXTENSIONS[data_format], 'w')
+#            file_object = open('experiments/test.dzn', 'w')
+            file_object.write(dzn)
+            file_object.close()
+
+        return mzn, dzn
         
         
     def pass_dict(self, input_list, inputdict, outputstr):
-        for i in input_list:
-            if i == input_list[-1]:
-                outputstr = str(outputstr) + str(inputdict[i]) + '];'
-            else:
-                outputstr = str(outputstr) + str(inputdict[i]) + ', '
-        return outputstr
+        return array_text(outputstr, [inputdict[i] for i in input_list])
     
     def pass_enum_or_array(self, input_list, outputtype, inputdict, resulttype, outputstr):
+        close = '};' if outputtype == 'enum' else '];'
         # if there is no dict passed into here, we simply process data contained in 'input_list'
         if not inputdict:
-            for i in input_list:
-                if i == input_list[-1]:
-                    if outputtype == 'enum':
-                        outputstr = str(outputstr) + str(i) + '};'
-                        break
-                    else:
-                        outputstr = str(outputstr) + str(i) + '];'
-                        break
-                outputstr = str(outputstr) + str(i) + ', '
-            return outputstr
-        
-        for i in input_list:
-            # specify the output format for the last element
-            if i == input_list[-1]:
-                # specify cases for output enumberation type
-                if outputtype == 'enum':
-                    outputstr = str(outputstr) + str(inputdict[i]) + '};'
-                    break
-                # not enumeration type, in our problem it is array type.
-                else:
-                    if resulttype == 'set':
-                        if inputdict[i] == []:
-                            outputstr = str(outputstr) + '{}];'
-                        for dim in range(len(inputdict[i])):
-                            if len(inputdict[i]) == 1:
-                                outputstr = str(outputstr) + '{' + str(inputdict[i][dim]) + '}];'
-                            elif dim == len(inputdict[i]) - 1:
-                                outputstr = str(outputstr) + str(inputdict[i][dim]) + '}];'
-                            elif dim == 0:
-                                outputstr = str(outputstr) + '{' + str(inputdict[i][dim]) + ', '
-                            else:
-                                outputstr = str(outputstr) + str(inputdict[i][dim]) + ', '
-                    else:
-                        outputstr = str(outputstr) + str(inputdict[i]) + '];'
-                    break
-                
-            # if not the last element, similarly specify how to output for enumberation and array.
-            if resulttype == 'set':
-                if inputdict[i] == []:
-                    outputstr = str(outputstr) + '{}, '
-                for dim in range(len(inputdict[i])):
-                    if len(inputdict[i]) == 1:
-                        outputstr = str(outputstr) + '{' + str(inputdict[i][dim]) + '}, '
-                    elif dim == len(inputdict[i]) - 1:
-                        outputstr = str(outputstr) + str(inputdict[i][dim]) + '}, '
-                    elif dim == 0:
-                        outputstr = str(outputstr) + '{' + str(inputdict[i][dim]) + ', '
-                    else:
-                        outputstr = str(outputstr) + str(inputdict[i][dim]) + ', '
-            else:
-                outputstr = str(outputstr) + str(inputdict[i]) + ', '
-        return outputstr
+            return array_text(outputstr, input_list, close)
+        if resulttype == 'set':
+            return array_text(outputstr, [set_text(inputdict[i]) for i in input_list], close)
+        return array_text(outputstr, [inputdict[i] for i in input_list], close)
 
     def pass_nparray(self, inputdict, ldim, wdim, inputarray, outputstr):
-        for i in inputdict:
-            for j in range(ldim):
-                for k in range(wdim):
-                    if i == inputdict[-1] and j == ldim - 1 and k == wdim - 1:                       
-                        outputstr = str(outputstr) + str(inputarray[i][j][k]) + '];'
-                        break
-                    outputstr = str(outputstr) + str(inputarray[i][j][k]) + ', '
-        return outputstr
-
+        return array_text(outputstr, [inputarray[i][j][k] for i in inputdict
+                                      for j in range(ldim) for k in range(wdim)])
 
 
 class DegreeRuleScraper:
@@ -1419,7 +1882,7 @@ class DegreeRuleScraper:
                 html = source_file.read()
         else:
             try:
-                html = requests.get(path).text
+                html = fetch.get(path)
             # requests module URL format errors are all subclasses of ValueError so catch them
             # here and try to process as a file path. Other exceptions should propagate.
             except ValueError:
@@ -1505,6 +1968,27 @@ class DegreeRuleScraper:
         subplan_links = self.get_subplan_links(self.get_subplan_header_(subplan_type))
         return subplan_links[subplan_title]
 
+    def scrape_subplans(self, subplan_titles, subplan_type):
+        """
+        Get the ProgramOrder trees of several subplans linked from this page.
+
+        The subplan pages are fetched and parsed concurrently, then their trees are built one
+        after the other in this thread, so nested subplans never wait on the pool from inside it.
+
+        :param subplan_titles: Titles of the subplans, as shown in the links on this page.
+        :param subplan_type: Subplan type
+        :return: List of ProgramOrder roots, in the same order as subplan_titles.
+        """
+        subplan_urls = [
+            self.build_subplan_url(self.get_subplan_url(subplan_title, subplan_type))
+            for subplan_title in subplan_titles
+            ]
+        subplan_scrapers = _subplan_pool.map(
+                lambda subplan_url: DegreeRuleScraper(subplan_url, header_id='requirements'),
+                subplan_urls
+                )
+        return [subplan_scraper.build_program_order_struct() for subplan_scraper in subplan_scrapers]
+
     @staticmethod
     def _minmax_operator(re_match):
         """
@@ -1794,12 +2278,7 @@ class DegreeRuleScraper:
                     )
             subplan_type = matches.group('subplan')
             subplan_options = node.get_child_text_as_lines()
-            for subplan_title in subplan_options:
-                subplan_url = self.build_subplan_url(
-                        self.get_subplan_url(subplan_title, subplan_type)
-                        )
-                subplan_scraper = DegreeRuleScraper(subplan_url, header_id='requirements')
-                subplan_orders = subplan_scraper.build_program_order_struct()
+            for subplan_orders in self.scrape_subplans(subplan_options, subplan_type):
                 new_order.add_child(subplan_orders)
             return new_order
 
@@ -1827,12 +2306,7 @@ class DegreeRuleScraper:
                     )
             subplan_type = 'major'
             subplan_options = node.get_child_text_as_lines()
-            for subplan_title in subplan_options:
-                subplan_url = self.build_subplan_url(
-                        self.get_subplan_url(subplan_title, subplan_type)
-                        )
-                subplan_scraper = DegreeRuleScraper(subplan_url, header_id='requirements')
-                subplan_orders = subplan_scraper.build_program_order_struct()
+            for subplan_orders in self.scrape_subplans(subplan_options, subplan_type):
                 new_order.add_child(subplan_orders)
             return new_order
 
@@ -1997,13 +2471,12 @@ class PandCScraper(object):
         else:
             self.pandc_url = self.pandc_year_url.format(year, code.upper())
 
-        response = requests.get(self.pandc_url, timeout=10)
-        response.raise_for_status()
+        content = fetch.get(self.pandc_url)
 
         # html5lib parser is slow and isn't built in, but seems to deal with some
         # poorly formatted P&C HTML better (e.g. <br> tags being immediately closed
         # instead of nesting the following content inside it)
-        self.soup = BeautifulSoup(response.content, "html5lib")
+        self.soup = BeautifulSoup(content, "html5lib")
         if self.soup.find('p', class_='error-page-message'):
             raise HTTPError('The page {} could not be found'.format(self.pandc_url))
 
@@ -0,0 +1,87 @@
+"""
+    Honour Project: ANU Study Planner
+"""
+
+"""
+    In this program, we compare the two data formats buildAModel can write
+    for the Master of Computing model: .dzn text and MiniZinc JSON. For each
+    format we time generating the model in Python and, if MiniZinc is
+    installed, MiniZinc reading and checking the model instance without
+    solving it. It also times writing the data of one request on top of a
+    static model that was built already, which is all a planning request does
+    once the static model is cached.
+
+    Usage:
+        python experiments/benchmark_data.py [--repeat 20]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from check_model_output import BASE_DIR, CASES, mcomp_program_order
+
+import data_process as dp
+from model_writer import DATA_EXTENSIONS
+
+MINIZINC = 'minizinc'
+
+
+def best_time(func, repeat):
+    """Run func repeat times and return the fastest run in seconds, with its result."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def benchmark(repeat):
+    orders = mcomp_program_order()
+    name, kwargs = CASES[0]
+    print('case {}, best of {} runs'.format(name, repeat))
+    minizinc = shutil.which(MINIZINC)
+    if minizinc is None:
+        print('{} not found, only timing generation'.format(MINIZINC))
+
+    for data_format in sorted(DATA_EXTENSIONS):
+        generate = lambda: orders.buildAModel(output_prefix=None, data_format=data_format,
+                                              **dict(kwargs, oldPlan={}))
+        generation, (mzn, data) = best_time(generate, repeat)
+        static = orders.build_static_model(kwargs['start_semester'], kwargs['spec'], False, data_format)
+        known_preference = kwargs['known_preference']
+        request = lambda: static.request_data(dp.preference_array(static.grad_courses, known_preference))
+        per_request, _ = best_time(request, repeat)
+        line = '{:>5}: generate {:8.2f} ms, request data {:6.3f} ms, data {:7d} bytes'.format(
+                data_format, generation * 1000, per_request * 1000, len(data.encode('utf-8')))
+
+        if minizinc is not None:
+            with tempfile.TemporaryDirectory(prefix='bench-') as workspace:
+                model_path = os.path.join(workspace, 'model.mzn')
+                data_path = os.path.join(workspace, 'model' + DATA_EXTENSIONS[data_format])
+                with open(model_path, 'w') as model_file:
+                    model_file.write(mzn)
+                with open(data_path, 'w') as data_file:
+                    data_file.write(data)
+                cmd = [minizinc, '--instance-check-only', '-I', BASE_DIR, model_path, data_path]
+                check = lambda: subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                parse, result = best_time(check, repeat)
+                if result.returncode != 0:
+                    line = line + ', MiniZinc failed: {}'.format(result.stderr.decode().strip())
+                else:
+                    line = line + ', MiniZinc check {:8.2f} ms'.format(parse * 1000)
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the dzn and JSON data formats.')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    sys.exit(benchmark(args.repeat))
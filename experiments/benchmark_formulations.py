@@ -0,0 +1,106 @@
+"""
+    Honour Project: ANU Study Planner
+"""
+
+"""
+    In this program, we compare the integer formulation of general.mzn with
+    the binary formulation of binary.mzn on the Master of Computing cases of
+    check_model_output.py. Every case is solved with both formulations by the
+    same MiniZinc solver, and we print the best solve time of each, how the
+    search ended and the objective found. Optimal objectives must be the same
+    for both. If CBC is installed, every case is also solved as a linear
+    program by CBC directly, without MiniZinc.
+
+    Usage:
+        python experiments/benchmark_formulations.py [--solver OSICBC] [--repeat 3] [--timeout 60]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+from check_model_output import BASE_DIR, CASES, mcomp_program_order
+
+import data_process as dp
+import planner
+import solver
+
+MINIZINC = 'minizinc'
+
+
+def solve_case(minizinc, static, kwargs, solver_name, timeout):
+    """Solve one case with MiniZinc and return the solver.SolverResult."""
+    preference = dp.preference_array(static.grad_courses, kwargs['known_preference'])
+    old_plan = None
+    if static.refining:
+        old_plan = dp.old_plan_array(static.grad_courses, dict(kwargs['oldPlan']), kwargs['replaced_course'])
+    with tempfile.TemporaryDirectory(prefix='formulation-') as workspace:
+        model_path, data_path = static.write_files(workspace)
+        request_path = os.path.join(workspace, 'request' + static.extension)
+        with open(request_path, 'w') as request_file:
+            request_file.write(static.request_data(preference, old_plan))
+        cmd = [minizinc, '--solver', solver_name, '-I', BASE_DIR, '--time-limit', str(int(timeout * 1000)),
+               model_path, data_path, request_path]
+        return solver.run(cmd, cwd=workspace, timeout=timeout + 5)
+
+
+def solve_direct(linear, kwargs, timeout):
+    """Solve one case as a linear program with CBC and return the solver.SolverResult."""
+    preference = dp.preference_array(linear.grad_courses, kwargs['known_preference'])
+    old_plan = None
+    if kwargs.get('replaced_course'):
+        old_plan = dp.old_plan_array(linear.grad_courses, dict(kwargs['oldPlan']), kwargs['replaced_course'])
+    return planner.solve_linear(linear, preference, old_plan, timeout)
+
+
+def report(name, label, results, objectives):
+    """Print the fastest of the results of one case."""
+    best = min(results, key=lambda result: result.elapsed)
+    objective = best.solution.get('objective') if best.solution is not None else None
+    if best.status == solver.OPTIMAL:
+        objectives.add(objective)
+    line = '{:>16} {:>8}: {:8.2f} s, {:<13} objective {}'.format(
+            name, label, best.elapsed, best.status, objective)
+    if best.returncode != 0 and best.solution is None:
+        line = line + ', failed: {}'.format(best.stderr.strip())
+    print(line)
+
+
+def benchmark(solver_name, repeat, timeout):
+    minizinc = shutil.which(MINIZINC)
+    cbc = shutil.which(planner.CBC)
+    if minizinc is None and cbc is None:
+        print('neither {} nor {} found, nothing to solve'.format(MINIZINC, planner.CBC))
+        return 1
+    print('solver {}, best of {} runs, time limit {} s'.format(solver_name, repeat, timeout))
+    if minizinc is None:
+        print('{} not found, only solving linear programs with CBC'.format(MINIZINC))
+    for name, kwargs in CASES:
+        if 'formulation' in kwargs:
+            continue
+        refining = bool(kwargs.get('replaced_course'))
+        objectives = set()
+        for formulation in sorted(dp.FORMULATIONS) if minizinc is not None else []:
+            static = mcomp_program_order().build_static_model(
+                    kwargs['start_semester'], kwargs['spec'], refining, 'dzn', kwargs.get('presolve', False),
+                    formulation)
+            results = [solve_case(minizinc, static, kwargs, solver_name, timeout) for _ in range(repeat)]
+            report(name, formulation, results, objectives)
+        if cbc is not None:
+            linear = mcomp_program_order().build_linear_model(
+                    kwargs['start_semester'], kwargs['spec'], kwargs.get('presolve', False))
+            results = [solve_direct(linear, kwargs, timeout) for _ in range(repeat)]
+            report(name, 'direct', results, objectives)
+        if len(objectives) > 1:
+            print('{:>16} optimal objectives differ'.format(name))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the integer and binary formulations.')
+    parser.add_argument('--solver', default='OSICBC')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+    sys.exit(benchmark(args.solver, args.repeat, args.timeout))
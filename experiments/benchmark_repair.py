@@ -0,0 +1,45 @@
+"""
+    Honour Project: ANU Study Planner
+"""
+
+"""
+    In this program, we time re-planning by repair on the Master of Computing
+    plan of check_model_output.py: every course of the old plan is replaced
+    in turn, and LinearModel.repair() looks for other courses to take in its
+    semester. A repaired plan is optimal and needs no solver; the others are
+    left to MiniZinc or CBC, starting from the old plan.
+
+    Usage:
+        python experiments/benchmark_repair.py [--presolve]
+"""
+
+import sys
+import time
+
+from check_model_output import OLD_PLAN, mcomp_program_order
+
+import data_process as dp
+
+
+def benchmark(presolve):
+    start = time.perf_counter()
+    linear = mcomp_program_order().build_linear_model(1, 0, presolve)
+    print('linear model: {} variables, {} rows, built in {:.1f} ms'.format(
+            len(linear.variables), len(linear.rows), (time.perf_counter() - start) * 1000))
+    preference = dp.preference_array(linear.grad_courses, {})
+    repaired = 0
+    for course, semester in sorted(OLD_PLAN.items(), key=lambda item: (item[1], item[0])):
+        old_plan = dp.old_plan_array(linear.grad_courses, OLD_PLAN, [course])
+        start = time.perf_counter()
+        solution = linear.repair(old_plan, [semester], preference)
+        elapsed = time.perf_counter() - start
+        outcome = 'left to the solver'
+        if solution is not None:
+            repaired = repaired + 1
+            outcome = 'swapped for ' + ', '.join(c for c in solution['plan'][semester - 1] if c not in OLD_PLAN)
+        print('S{} {}: {:7.1f} ms, {}'.format(semester, course, elapsed * 1000, outcome))
+    print('{} of {} replacements repaired'.format(repaired, len(OLD_PLAN)))
+
+
+if __name__ == '__main__':
+    sys.exit(benchmark('--presolve' in sys.argv[1:]))
@@ -0,0 +1,140 @@
+"""
+    Honour Project: ANU Study Planner
+"""
+
+"""
+    In this program, we check that ProgramOrder.buildAModel still writes
+    exactly the same model and data text for the Master of Computing (MCOMP)
+    as it did when the files in experiments/mcomp were recorded. The MCOMP
+    requirement tree is built by hand below, as scraped from the 2019 P&C
+    page, so no network access is needed.
+
+    The order of the courses in the data file follows the iteration order of
+    AVAILABLE_CODE, which depends on the hash seed. The check therefore runs
+    itself again with PYTHONHASHSEED=0 and a fresh bytecode cache.
+
+    Usage:
+        python experiments/check_model_output.py [--update]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXPECTED_DIR = os.path.join(BASE_DIR, 'experiments', 'mcomp')
+sys.path.insert(0, BASE_DIR)
+
+OLD_PLAN = {
+    'COMP6710': 1, 'MATH6005': 1, 'COMP6340': 1, 'COMP8701': 1,
+    'COMP6250': 2, 'COMP8260': 2, 'COMP6466': 2, 'COMP6670': 2,
+    'COMP6442': 3, 'COMP8110': 3, 'COMP8715': 3, 'COMP6445': 3,
+    'COMP6120': 4, 'COMP6240': 4, 'COMP8755': 4, 'COMP8670': 4,
+    }
+# Name of each case: keyword arguments of buildAModel.
+CASES = [
+    ('plan', dict(known_preference={}, start_semester=1, spec=0)),
+    ('plan_spec1', dict(known_preference={'COMP6240': 0, 'COMP8600': 0.8}, start_semester=3, spec=1)),
+    ('replan', dict(known_preference={}, start_semester=1, spec=0, oldPlan=OLD_PLAN,
+                    replaced_course=['COMP6240'])),
+    ('plan_spec2', dict(known_preference={'COMP6461': 1.0}, start_semester=2, spec=2)),
+    ('plan_presolved', dict(known_preference={'COMP8600': 0.8}, start_semester=2, spec=1, presolve=True)),
+    ('replan_presolved', dict(known_preference={}, start_semester=1, spec=0, oldPlan=OLD_PLAN,
+                              replaced_course=['COMP6240'], presolve=True)),
+    ('plan_binary', dict(known_preference={'COMP6240': 0, 'COMP8600': 0.8}, start_semester=3, spec=1,
+                         formulation='binary')),
+    ('replan_binary', dict(known_preference={}, start_semester=1, spec=0, oldPlan=OLD_PLAN,
+                           replaced_course=['COMP6240'], presolve=True, formulation='binary',
+                           warm_start=True)),
+    ]
+
+
+def mcomp_program_order():
+    """Build the ProgramOrder tree of 7706XMCOMP (2019) by hand."""
+    import data_process as dp
+    from data_process import ProgramOrder, CourseListFilter, CourseRegexFilter, build_course_regex
+
+    def order(units, operator, course_filter=None):
+        return ProgramOrder('7706XMCOMP', '', '', units, operator, course_filter)
+
+    def group(operator, children, title=''):
+        container = ProgramOrder('7706XMCOMP', title, '', -1, operator)
+        for child in children:
+            container.add_child(child)
+        return container
+
+    level8 = lambda: CourseRegexFilter(build_course_regex(None, ['8']))
+    comp = lambda: CourseRegexFilter(build_course_regex(['COMP']))
+    # The AI specialisation is not recognised by the scraper, buildAModel fills it in.
+    ai = group('AND', [order(24, '>='), order(0, '=='), order(0, '=='), order(0, '=='), order(0, '==')])
+    data_science = group('AND', [
+            order(24, '>='),
+            order(18, '==', CourseListFilter(['COMP8410', 'COMP8430', 'COMP6490'])),
+            order(6, '==', CourseListFilter(['COMP6320', 'COMP8420', 'COMP8600', 'COMP8620', 'COMP8650'])),
+            ])
+    human_centred = group('AND', [
+            order(24, '>='),
+            order(12, '>=', level8()),
+            order(12, '<=', CourseListFilter(['COMP6353', 'COMP6390', 'COMP6461'])),
+            order(12, '>=', CourseListFilter(['COMP8100', 'COMP8173', 'COMP8190', 'COMP8420',
+                                              'VCPG6001', 'VCPG6004', 'VCPG8001'])),
+            ])
+    specialisations = group('OR', [ai, data_science, human_centred],
+                            dp.ORDER_LABEL['PRINCIPAL_SUBPLAN_CHOICE'])
+    alternatives = group('OR', [
+            group('AND', [order(30, '==', comp())]),
+            group('AND', [order(6, '==', comp()), specialisations]),
+            ], dp.ORDER_LABEL['PRINCIPAL_ALTERNATIVE_SETS'])
+    return group('AND', [
+            order(96, '>='),
+            order(36, '>=', level8()),
+            order(36, '==', CourseListFilter(['COMP6250', 'COMP6442', 'COMP6710', 'COMP8110',
+                                              'COMP8260', 'MATH6005'])),
+            order(6, '==', CourseListFilter(['COMP6120', 'COMP8190'])),
+            order(6, '==', CourseListFilter(['COMP6240', 'COMP6420'])),
+            order(6, '==', CourseListFilter(['COMP6331', 'COMP6340'])),
+            order(12, '==', CourseListFilter(['COMP8715', 'COMP8755', 'COMP8830'])),
+            alternatives,
+            order(0, '=='),
+            ])
+
+
+def build_models():
+    """Return a dict of file name: text for every case."""
+    models = dict()
+    for name, kwargs in CASES:
+        kwargs = dict(kwargs, oldPlan=dict(kwargs.get('oldPlan', {})), output_prefix=None)
+        mzn, dzn = mcomp_program_order().buildAModel(**kwargs)
+        models[name + '.mzn'] = mzn
+        models[name + '.dzn'] = dzn
+    return models
+
+
+def check(update=False):
+    models = build_models()
+    if update:
+        os.makedirs(EXPECTED_DIR, exist_ok=True)
+        for file_name, text in sorted(models.items()):
+            with open(os.path.join(EXPECTED_DIR, file_name), 'w', newline='\r\n') as model_file:
+                model_file.write(text)
+        print('recorded {} files in {}'.format(len(models), EXPECTED_DIR))
+        return True
+    same = True
+    for file_name, text in sorted(models.items()):
+        with open(os.path.join(EXPECTED_DIR, file_name)) as model_file:
+            expected = model_file.read()
+        if text != expected:
+            same = False
+            print('{}: differs from the recorded output'.format(file_name))
+    if same:
+        print('all {} files match'.format(len(models)))
+    return same
+
+
+if __name__ == '__main__':
+    if os.environ.get('PYTHONHASHSEED') != '0':
+        with tempfile.TemporaryDirectory() as pycache:
+            env = dict(os.environ, PYTHONHASHSEED='0', PYTHONPYCACHEPREFIX=pycache)
+            sys.exit(subprocess.call([sys.executable] + sys.argv, env=env))
+    sys.exit(0 if check('--update' in sys.argv[1:]) else 1)
@@ -0,0 +1,79 @@
+"""
+    Honour Project: ANU Study Planner
+"""
+
+"""
+    In this program, we compare the Master of Computing models written with
+    and without presolving. For each case we count the courses MiniZinc
+    creates a takes variable for and the size of the data, and, if MiniZinc
+    is installed, the size of the FlatZinc it flattens the model into.
+
+    It also lists the courses presolving finds impossible, and the courses of
+    the catalog that are on a cycle of requisites.
+
+    Usage:
+        python experiments/presolve_stats.py
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from check_model_output import BASE_DIR, CASES, mcomp_program_order
+
+import data_process as dp
+
+MINIZINC = 'minizinc'
+SOLVER = 'OSICBC'
+
+
+def flatzinc_size(minizinc, static):
+    """Flatten a model with MiniZinc and return the size of the FlatZinc in bytes, or None."""
+    preference = [3] * len(static.grad_courses)
+    old_plan = [0] * len(static.grad_courses) if static.refining else None
+    with tempfile.TemporaryDirectory(prefix='presolve-') as workspace:
+        model_path, data_path = static.write_files(workspace)
+        request_path = os.path.join(workspace, 'request' + static.extension)
+        with open(request_path, 'w') as request_file:
+            request_file.write(static.request_data(preference, old_plan))
+        fzn_path = os.path.join(workspace, 'model.fzn')
+        cmd = [minizinc, '-c', '--solver', SOLVER, '-I', BASE_DIR, '--fzn', fzn_path,
+               model_path, data_path, request_path]
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0 or not os.path.exists(fzn_path):
+            return None
+        return os.path.getsize(fzn_path)
+
+
+def compare():
+    print('courses on a requisite cycle: {}'.format(', '.join(dp.CATALOG.cyclic_courses()) or '-'))
+    minizinc = shutil.which(MINIZINC)
+    if minizinc is None:
+        print('{} not found, FlatZinc is not measured'.format(MINIZINC))
+    for name, kwargs in CASES:
+        if kwargs.get('presolve'):
+            continue
+        refining = bool(kwargs.get('replaced_course'))
+        plain = None
+        for presolve in (False, True):
+            static = mcomp_program_order().build_static_model(
+                    kwargs['start_semester'], kwargs['spec'], refining, 'dzn', presolve)
+            # takes covers the grad courses, None and the undergrad courses.
+            courses = static.data.split('courses = {', 1)[1].split('};', 1)[0].count(',') + 1
+            line = '{:>10} {:>8}: {:3d} courses, {:3d} grad courses, data {:6d} bytes'.format(
+                    name, 'presolve' if presolve else 'plain', courses, len(static.grad_courses),
+                    len(static.data))
+            if minizinc is not None:
+                size = flatzinc_size(minizinc, static)
+                line = line + (', FlatZinc {:8d} bytes'.format(size) if size is not None
+                               else ', flattening failed')
+            print(line)
+            plain = plain or static
+        dropped = [c for c in plain.grad_courses if c not in static.grad_courses]
+        print('{:>10} dropped: {}'.format(name, ', '.join(dropped) or '-'))
+
+
+if __name__ == '__main__':
+    sys.exit(compare())
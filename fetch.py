@@ -0,0 +1,141 @@
+"""
+    Honour Project: ANU Study Planner
+"""
+
+"""
+    In this program, we fetch pages from the Programs & Courses website for
+    both scrapers. All fetches share one HTTP session (so connections are kept
+    alive and reused), failed requests are retried with a backoff, and no more
+    than a few requests go to the same host at a time. Pages are kept in a
+    local response store and requested again with If-None-Match /
+    If-Modified-Since, so unchanged pages are not downloaded twice.
+
+    Alternatively, the pages can be served from an offline snapshot built by
+    snapshot.py, in which case the network is not used at all.
+"""
+
+import os
+import threading
+try:
+    from urllib.parse import urlparse
+except:
+    from urlparse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from cache import disk_store
+
+TIMEOUT = 10
+RETRIES = 3
+BACKOFF = 0.5
+MAX_PER_HOST = int(os.environ.get('PLANNER_MAX_PER_HOST', 4))
+
+
+class Fetcher:
+    """
+    Fetch pages over a shared, pooled session with conditional requests, retries and
+    a limit on concurrent requests per host.
+    """
+    def __init__(self, store=None, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF,
+                 max_per_host=MAX_PER_HOST):
+        """
+        :param store: Optional DiskStore (or anything with get/put) keeping the last response
+        of each URL together with its ETag and Last-Modified headers.
+        :param timeout: Seconds to wait for the server before giving up on an attempt.
+        :param retries: Number of times a failed request is retried.
+        :param backoff: Backoff factor between retries, the n-th retry waits backoff * 2^(n-1).
+        :param max_per_host: Maximum number of requests in flight to the same host.
+        """
+        self.store = store
+        self.timeout = timeout
+        self.max_per_host = max_per_host
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+                pool_connections=8,
+                pool_maxsize=max(max_per_host, 1),
+                max_retries=Retry(total=retries, backoff_factor=backoff,
+                                  status_forcelist=(500, 502, 503, 504))
+                )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.host_limits = dict()
+        self.lock = threading.Lock()
+
+    def _host_limit(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.host_limits:
+                self.host_limits[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self.host_limits[host]
+
+    def get(self, url):
+        """
+        Fetch a page.
+
+        requests raises a ValueError subclass for malformed URLs, which callers may use to
+        fall back to reading a file.
+
+        :param url: The URL of the page.
+        :return: The body of the page as bytes.
+        """
+        stored = self.store.get(url) if self.store is not None else None
+        headers = dict()
+        if stored:
+            if stored.get('etag'):
+                headers['If-None-Match'] = stored['etag']
+            if stored.get('last_modified'):
+                headers['If-Modified-Since'] = stored['last_modified']
+
+        with self._host_limit(url):
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+
+        if response.status_code == 304 and stored:
+            return stored['content']
+        response.raise_for_status()
+        if self.store is not None and (response.headers.get('ETag')
+                                       or response.headers.get('Last-Modified')):
+            self.store.put(url, {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'content': response.content,
+                })
+        return response.content
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+_snapshot = None
+
+
+def get_fetcher():
+    """Return the Fetcher shared by the whole process, creating it on first use."""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = Fetcher(disk_store('http'))
+        return _fetcher
+
+
+def use_snapshot(snapshot):
+    """
+    Serve every page from snapshot (a snapshot.Snapshot) instead of the network, or go
+    back to the network if snapshot is None.
+    """
+    global _snapshot
+    _snapshot = snapshot
+
+
+def source():
+    """Name where pages currently come from, so cached results can tell sources apart."""
+    if _snapshot is not None:
+        return 'snapshot:' + _snapshot.version
+    return 'live'
+
+
+def get(url):
+    """Fetch a page from the snapshot in use, or with the shared Fetcher, and return its body as bytes."""
+    if _snapshot is not None:
+        return _snapshot.get(url)
+    return get_fetcher().get(url)
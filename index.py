@@ -1,8 +1,10 @@
 from flask import Flask, render_template, request, jsonify, make_response
+import click
 import os
-import json
-import data_process as dp
-import re
+import fetch
+import planner
+from snapshot import Snapshot
+from jobs import JobQueue, JobQueueFull, FAILED, CANCELLED
 app = Flask(__name__)
 
 """
@@ -17,6 +19,34 @@ app = Flask(__name__)
     back end.
 """
 
+# In snapshot mode every P&C page (programs, subplans and courses) is read from
+# the offline snapshot at PLANNER_SNAPSHOT, so planning never uses the network.
+if os.environ.get('PLANNER_SNAPSHOT'):
+    fetch.use_snapshot(Snapshot(os.environ['PLANNER_SNAPSHOT']))
+
+# Planning jobs run on a small pool of workers, so that the web server itself
+# stays free for cheap requests. The page polls its job every second, a job
+# nobody polled for PLANNER_JOB_ABANDON seconds is cancelled and its solver killed.
+jobs = JobQueue(int(os.environ.get('PLANNER_WORKERS', 2)),
+                int(os.environ.get('PLANNER_MAX_PENDING', 32)),
+                abandon_seconds=float(os.environ.get('PLANNER_JOB_ABANDON', 15)))
+
+@app.cli.command('invalidate-program')
+@click.argument('program')
+def invalidateProgram(program):
+    """
+        Forget the cached program orders of PROGRAM, e.g. flask invalidate-program 7706XMCOMP
+    """
+    planner.invalidate_program(program)
+
+@app.cli.command('portfolio-stats')
+def portfolioStats():
+    """
+        Show how many portfolio races each solver won, from the portfolio log.
+    """
+    for name, wins in planner.portfolio_summary().most_common():
+        click.echo('{}\t{}'.format(name, wins))
+
 @app.route('/', methods=['POST','GET'])
 def index(name=None):
     """
@@ -24,49 +54,57 @@ def index(name=None):
     """
     return render_template('tree.html', name=name)
 
-@app.route('/receiveData', methods=['POST','GET'])
-def receiveData():
+def readRequest(preference, update=False):
     """
-        In this function, the server receive data from the front end, call the
-        pre-processing program and after constructing the model, it returns the
-        plan generated by our model back to the front end.
+        Collect user information from the data sent by the front end.
+
+        :param preference: The json object received from the front end, the 
+        remaining items after this call are the preference values of courses.
+        :param update: Whether this request is re-planning a plan shown in the table
+        :return: The arguments of planner.make_plan for this request
+        :raises ValueError: If the timeout or formulation of the request, or the plan
+        it updates, is invalid
     """
-    preference = request.get_json()
     program = preference.pop('program')
     enroll_yr = preference.pop('enroll_yr')
     enroll_sem = preference.pop('enroll_sem')
+    # user's specialisation 
     spec = 0
     if 'spec' in preference:
         spec = int(preference['spec'])
         preference.pop('spec')
+    # Obtain the list containing replaced courses and the to-be-updated plan,
+    # which is sent back by the front end together with the request.
+    replaced = preference.pop('replaced', [])
+    table = preference.pop('plan', None)
+    # seconds the solver may search for a plan
+    timeout = planner.solve_timeout(preference.pop('timeout', None))
+    # 'integer' or 'binary' model, the planner's default if not given
+    formulation = planner.model_formulation(preference.pop('formulation', None))
 
-    program_link = 'https://programsandcourses.anu.edu.au/2019/program/'
-
-    program_link = str(program_link) + str(program)
     # calculate which type of semester does the enrolled semester fall in
     # S1 in odd year, S2 in odd year, S1 in even year or S2 in even year 
-    if int(enroll_yr)%2 == 1:
-        if int(enroll_sem)%2 == 1:
-            sem = 1
-        else:
-            sem = 2
-    else:
-        if int(enroll_sem)%2 == 1:
-            sem = 3
-        else:
-            sem = 4
-            
-    # call the pre-processing program which put the model in file test1.mzn & test1.dzn
-    scraper = dp.DegreeRuleScraper(str(program_link))
-    orders = scraper.build_program_order_struct()
-    orders.buildAModel(preference, sem, spec)
-    
-    # call MiniZinc to solve for the model
-    cmd = 'minizinc --solver OSICBC test1.mzn test1.dzn > plan.txt'
-    os.system(cmd)
-    jsondata = readmyJson('plan')
-       
-    return jsonify(jsondata)
+    sem = planner.semester_type(enroll_yr, enroll_sem)
+    if not update:
+        return (program, sem, spec, preference, None, None, timeout, formulation)
+    # the old plan only matters when some of its courses are replaced
+    oldPlan = planner.old_plan_from_table(table) if replaced else dict()
+    return (program, sem, spec, preference, oldPlan, replaced, timeout, formulation)
+
+@app.route('/receiveData', methods=['POST','GET'])
+def receiveData():
+    """
+        In this function, the server receive data from the front end, call the
+        pre-processing program and after constructing the model, it returns the
+        plan generated by our model back to the front end.
+    """
+    try:
+        args = readRequest(request.get_json())
+    except ValueError as e:
+        return invalidRequest(e)
+    # build the model and solve it in a workspace private to this request
+    plan = planner.make_plan(*args)
+    return dumpPlan(plan)
 
 @app.route('/returnTheTable', methods=['POST','GET'])
 def returnTheTable():
@@ -75,107 +113,93 @@ def returnTheTable():
         After receiving the table, the MiniZinc model would be called and re-plan
         the courses.
     """
-    preference = request.get_json()
-    # Obtain the list containing replaced courses and the to-be-updated plan
-    replaced = preference.pop('replaced')
-    oldPlan = dict()
-    readPlan = open('plan.txt')
     try:
-        content = str(readPlan.read())
-        courses = content.split(' ')[:-1]
-        current = 0
-        for i in courses:
-            if re.match(r'^[0-9]', str(i)):
-                current = int(i)
-            else:
-                oldPlan[i] = current
-    finally:
-        readPlan.close()
-    
-    # collect user information
-    program = preference.pop('program')
-    enroll_yr = preference.pop('enroll_yr')
-    enroll_sem = preference.pop('enroll_sem')
-    # user's specialisation 
-    spec = 0
-    if 'spec' in preference:
-        spec = int(preference['spec'])
-        preference.pop('spec')
-    
-    program_link = 'https://programsandcourses.anu.edu.au/2019/program/'
-
-    program_link = str(program_link) + str(program)
-    if int(enroll_yr)%2 == 1:
-        if int(enroll_sem)%2 == 1:
-            sem = 1
-        else:
-            sem = 2
-    else:
-        if int(enroll_sem)%2 == 1:
-            sem = 3
-        else:
-            sem = 4
-    # call the pre-processing program which put the model in file test1.mzn & test1.dzn
-    scraper = dp.DegreeRuleScraper(str(program_link))
-    orders = scraper.build_program_order_struct()
-    orders.buildAModel(preference, sem, spec, oldPlan, replaced)
-    
-    # call MiniZinc to solve for the model
-    cmd = 'minizinc --solver OSICBC test1.mzn test1.dzn > re-plan.txt'
-    os.system(cmd)
-    # read the new plan from the file containing it.
-    jsondata = readmyJson('re-plan')
-    return jsonify(jsondata)
-    
-def readmyJson(filename):
+        args = readRequest(request.get_json(), update=True)
+    except ValueError as e:
+        return invalidRequest(e)
+    # build the model and re-plan the courses in a private workspace
+    plan = planner.make_plan(*args)
+    return dumpPlan(plan)
+
+@app.route('/jobs/plan', methods=['POST'])
+def submitPlan():
     """
-        Reading files storing our generated plan, this function converts it into
-        regular lists in Python.
+        Same as receiveData, but the plan is made by a background job. The id of
+        the job is returned at once and the front end polls for the result.
     """
-    file_object = open(str(filename)+'.txt')
-    plan = dict()
     try:
-        file_context = str(file_object.read())
-        courses = file_context.split(' ')[:-1]
-        plan1 = dict()
-        plan2 = dict()
-        plan3 = dict()
-        plan4 = dict()
-        plan1['semester'] = 'S1'
-        plan2['semester'] = 'S2'
-        plan3['semester'] = 'S3'
-        plan4['semester'] = 'S4'
-        timer = 0
-        for i in courses:
-            if len(i) == 1:
-                # len(i) == 1 => this is not a course but a number denoting which 
-                # semester the following courses should be taken (the format used in
-                # those .txt file to separate courses in different semesters).
-                timer = 1
-                if int(i) == 1:
-                    plan = plan1
-                elif int(i) == 2:
-                    plan = plan2
-                elif int(i) == 3:
-                    plan = plan3
-                else:
-                    plan = plan4
-            else:
-                # otherwise this element is a course.
-                index = 'c'+str(timer)
-                plan[index] = str(i)
-                timer = timer + 1
-        
-        # Construct the final plan by adding course list for different semesters
-        # into it.
-        finalplan = list()
-        finalplan.append(plan1)
-        finalplan.append(plan2)
-        finalplan.append(plan3)
-        finalplan.append(plan4)
-        
-        jsondata = json.dumps(finalplan, sort_keys=True, indent=4, separators=(',', ': '))
-        
-    finally:
-        file_object.close() 
-    return jsondata
\ No newline at end of file
+        return submitJob(readRequest(request.get_json()))
+    except ValueError as e:
+        return invalidRequest(e)
+
+@app.route('/jobs/replan', methods=['POST'])
+def submitReplan():
+    """
+        Same as returnTheTable, but the plan is made by a background job.
+    """
+    try:
+        return submitJob(readRequest(request.get_json(), update=True))
+    except ValueError as e:
+        return invalidRequest(e)
+
+def invalidRequest(error):
+    """
+        Refuse a planning request whose parameters are invalid, telling why.
+    """
+    return make_response(jsonify({'error': str(error)}), 400)
+
+def submitJob(args):
+    """
+        Queue planner.make_plan(*args) as a job, or refuse it if too many jobs
+        are waiting already.
+    """
+    try:
+        job = jobs.submit(planner.make_plan, *args, cancellable=True)
+    except JobQueueFull as e:
+        return make_response(jsonify({'error': str(e)}), 503)
+    return make_response(jsonify(job.to_dict()), 202)
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def jobStatus(job_id):
+    """
+        Report whether a planning job is queued, running, done or failed.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return make_response(jsonify({'job': job_id, 'error': 'Unknown job'}), 404)
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def jobResult(job_id):
+    """
+        Return the plan made by a job in the same format as receiveData, or the
+        status of the job (202) if it is not finished yet.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return make_response(jsonify({'job': job_id, 'error': 'Unknown job'}), 404)
+    if job.is_pending:
+        return make_response(jsonify(job.to_dict()), 202)
+    if job.status == FAILED:
+        return make_response(jsonify(job.to_dict()), 500)
+    if job.status == CANCELLED:
+        return make_response(jsonify(job.to_dict()), 410)
+    return dumpPlan(job.result)
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancelJob(job_id):
+    """
+        Cancel a planning job, e.g. when its page is closed. A running solver
+        is killed.
+    """
+    job = jobs.cancel(job_id)
+    if job is None:
+        return make_response(jsonify({'job': job_id, 'error': 'Unknown job'}), 404)
+    return jsonify(job.to_dict())
+    
+def dumpPlan(plan):
+    """
+        Encode the plan generated by our model for the front end, as the JSON
+        body of the response.
+    """
+    return jsonify(plan)
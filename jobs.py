@@ -0,0 +1,147 @@
+"""
+    Honour Project: ANU Study Planner
+"""
+
+"""
+    In this program, we run planning requests as background jobs. A job is
+    submitted to a bounded pool of worker threads and gets an id straight away,
+    so the web server does not have to wait for the scraper and the solver.
+    The front end then polls the job until its plan is ready.
+
+    A job can be cancelled, and a job nobody polled for a while counts as
+    cancelled too, so that a closed page does not keep a solver running.
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class JobQueueFull(RuntimeError):
+    """Raised when too many jobs are already waiting for a worker."""
+
+
+class Job:
+    """
+    Store the state of one submitted job.
+    """
+    def __init__(self, job_id, abandon_seconds=None):
+        """
+        :param job_id: Id of the job.
+        :param abandon_seconds: Seconds without polling after which the job counts as
+        cancelled, or None to never give up on it.
+        """
+        self.id = job_id
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.finished = None
+        self.abandon_seconds = abandon_seconds
+        self.polled = self.submitted
+        self.cancel_requested = False
+
+    def cancel(self):
+        self.cancel_requested = True
+
+    def is_cancelled(self):
+        """Tell whether the job was cancelled, or nobody polled it for abandon_seconds."""
+        if self.cancel_requested:
+            return True
+        return self.abandon_seconds is not None and time.time() - self.polled > self.abandon_seconds
+
+    @property
+    def is_pending(self):
+        return self.status in (QUEUED, RUNNING)
+
+    def to_dict(self):
+        """Describe the job for the status endpoint."""
+        description = {'job': self.id, 'status': self.status}
+        if self.error is not None:
+            description['error'] = self.error
+        return description
+
+
+class JobQueue:
+    """
+    Run jobs on a bounded pool of worker threads and keep their results for a while.
+    """
+    def __init__(self, workers=2, max_pending=32, keep_seconds=600, abandon_seconds=None):
+        """
+        :param workers: Number of jobs that may run at the same time.
+        :param max_pending: Number of unfinished jobs accepted before submit() refuses more.
+        :param keep_seconds: How long the result of a finished job is kept for polling.
+        :param abandon_seconds: Seconds without polling after which a job counts as cancelled,
+        or None to run every job to its end.
+        """
+        self.max_pending = max_pending
+        self.keep_seconds = keep_seconds
+        self.abandon_seconds = abandon_seconds
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.jobs = dict()
+        self.lock = threading.Lock()
+
+    def _expire(self):
+        """Forget finished jobs whose results nobody collected in time."""
+        now = time.time()
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job.finished is not None and now - job.finished > self.keep_seconds]:
+            del self.jobs[job_id]
+
+    def submit(self, func, *args, cancellable=False, **kwargs):
+        """
+        Queue func(*args, **kwargs) to run on a worker.
+
+        :param cancellable: Also pass cancelled=job.is_cancelled to func, so that it can stop
+        early once the job is cancelled.
+        :return: The Job that tracks the call.
+        """
+        with self.lock:
+            self._expire()
+            if sum(1 for job in self.jobs.values() if job.is_pending) >= self.max_pending:
+                raise JobQueueFull('Too many planning jobs are waiting, try again later.')
+            job = Job(uuid.uuid4().hex, self.abandon_seconds)
+            self.jobs[job.id] = job
+        if cancellable:
+            kwargs = dict(kwargs, cancelled=job.is_cancelled)
+        self.executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    @staticmethod
+    def _run(job, func, args, kwargs):
+        if job.is_cancelled():
+            job.status = CANCELLED
+            job.finished = time.time()
+            return
+        job.status = RUNNING
+        try:
+            job.result = func(*args, **kwargs)
+            job.status = CANCELLED if job.is_cancelled() else DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+
+    def get(self, job_id):
+        """Return the Job with this id, or None if it is unknown or expired. This counts as polling it."""
+        with self.lock:
+            self._expire()
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job.polled = time.time()
+            return job
+
+    def cancel(self, job_id):
+        """Cancel the job with this id, and return it or None if it is unknown or expired."""
+        job = self.get(job_id)
+        if job is not None and job.is_pending:
+            job.cancel()
+        return job
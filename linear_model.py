@@ -0,0 +1,432 @@
+"""
+    Honour Project: ANU Study Planner
+"""
+
+"""
+    In this program, we write a plan model as a 0/1 linear program in the LP
+    file format and read back the solution CBC writes for it, so that a plan
+    can be solved without MiniZinc flattening the model first.
+
+    The linear program is the binary formulation of binary.mzn: a variable
+    for every course, semester and unit value a course can be taken with,
+    and one more for every requirement, which is 1 only if the requirement is
+    met. ProgramOrder.build_linear_model() adds the rows of a program, this
+    module only knows about courses, semesters and rows.
+
+    CBC always minimises here. A plan that maximises preferences minimises
+    their negation, and the objective is reported the way MiniZinc reports
+    it, computed from the values of the variables.
+
+    The rows also tell whether a given plan is valid, which lets a refined
+    plan be repaired without any solver: when the replaced courses can be
+    swapped for other courses in the same semesters, the plan moves no
+    course and no refined plan can be closer to the old one.
+"""
+
+import collections
+import itertools
+
+import solver
+from model_writer import ModelWriter
+
+# A variable fixed to 0, standing in for the terms of a row that has none.
+ZERO = 'zero'
+# Terms written on one line of a row or of the objective.
+TERMS_PER_LINE = 8
+# Plans LinearModel.repair() tries at most.
+REPAIR_LIMIT = 200
+
+
+def course_variable(code, semester, units):
+    """Return the name of the variable of taking a course in a semester for a unit value."""
+    return 'z_{}_{}_{}'.format(code, semester, units)
+
+
+def row(name, terms, sense, rhs):
+    """
+    Return the row sum(coefficient * variable) sense rhs as a tuple (name, terms, sense, rhs),
+    or None if it has no terms and always holds.
+
+    :param terms: Dict of variable: coefficient, terms with coefficient 0 are left out.
+    :param sense: '<=', '>=' or '='.
+    """
+    terms = {variable: coefficient for variable, coefficient in terms.items() if coefficient != 0}
+    if not terms:
+        if (sense == '<=' and 0 <= rhs) or (sense == '>=' and 0 >= rhs) or (sense == '=' and rhs == 0):
+            return None
+        # An empty row that cannot hold makes the whole program infeasible.
+        terms = {ZERO: 1}
+    return name, terms, sense, rhs
+
+
+def status_of(line):
+    """
+    Tell how CBC ended from the first line of its solution file, e.g.
+    'Optimal - objective value -42.00000000'.
+
+    :return: A tuple (status of solver.py, whether the file holds a solution)
+    """
+    line = line.strip()
+    if line.startswith('Optimal'):
+        return solver.OPTIMAL, True
+    if 'infeasible' in line.lower():
+        return solver.UNSATISFIABLE, False
+    if line.startswith('Stopped'):
+        # Stopped at the time limit, with the best plan so far unless it found none.
+        return (solver.UNKNOWN, False) if 'no integer solution' in line else (solver.SATISFIED, True)
+    return solver.UNKNOWN, False
+
+
+class LinearModel:
+    """
+    A 0/1 linear program of a plan: the variables of the courses, the rows every request
+    shares, and the objective and hard preferences of one request added when it is written.
+    """
+    def __init__(self, grad_courses, no_of_semesters, dropped=None):
+        """
+        :param grad_courses: List of grad courses, in the order of the preference and old_plan
+        arrays.
+        :param no_of_semesters: Number of semesters of a plan.
+        :param dropped: List of the grad courses presolve left out, see StaticModel.
+        """
+        self.grad_courses = grad_courses
+        self.no_of_semesters = no_of_semesters
+        self.dropped = dropped or list()
+        # Course code: list of (variable, semester, units) it can be taken with.
+        self.course_slots = {c: list() for c in grad_courses}
+        self.slot_variables = set()
+        self.variables = list()
+        # Tuples (name, dict of variable: coefficient, sense, right hand side).
+        self.rows = list()
+        # Semester: units taken in it, see add_load_row().
+        self.loads = dict()
+        # Indexes of the rows, built by satisfied() when first needed.
+        self._row_index = None
+
+    def add_variable(self, name):
+        self.variables.append(name)
+        return name
+
+    def add_course_slot(self, code, semester, units):
+        """Add the variable of taking a grad course in a semester for a unit value."""
+        name = self.add_variable(course_variable(code, semester, units))
+        self.course_slots[code].append((name, semester, units))
+        self.slot_variables.add(name)
+        return name
+
+    def add_row(self, terms, sense, rhs, name=None):
+        """Add the row sum(coefficient * variable) sense rhs, see row()."""
+        added = row(name or 'r' + str(len(self.rows) + 1), terms, sense, rhs)
+        if added is not None:
+            self.rows.append(added)
+            self._row_index = None
+
+    def add_load_row(self, semester, load):
+        """Add the row of the units taken in a semester, which sum up to load."""
+        terms = {variable: units for code in self.grad_courses
+                 for variable, taken, units in self.course_slots[code] if taken == semester}
+        self.add_row(terms, '=', load, 'load_' + str(semester))
+        self.loads[semester] = load
+
+    def slot_terms(self, code, coefficient):
+        """Return the terms coefficient(semester, units) * variable over the slots of a course."""
+        return {variable: coefficient(semester, units)
+                for variable, semester, units in self.course_slots.get(code, ())}
+
+    def taken_terms(self, code, semesters=None):
+        """Terms that are 1 if a course is taken in one of the given semesters, or in any if None."""
+        return {variable: 1 for variable, semester, _ in self.course_slots.get(code, ())
+                if semesters is None or semester in semesters}
+
+    def unit_terms(self, codes):
+        """
+        Terms of the sum of the units of the given courses that are taken, a course given twice
+        counting twice.
+        """
+        terms = dict()
+        for code in codes:
+            for variable, coefficient in self.slot_terms(code, lambda s, u: u).items():
+                terms[variable] = terms.get(variable, 0) + coefficient
+        return terms
+
+    def max_units(self, codes):
+        """The largest sum of units the given courses can count for."""
+        return sum(max([units for _, _, units in self.course_slots.get(code, ())] or [0]) for code in codes)
+
+    def objective(self, preference, old_plan=None):
+        """
+        Return the objective of a request as a tuple (terms, constant) to minimise: the negated
+        sum of the preferences of the courses taken for a new plan, or the distance from the old
+        plan, as in the solve items of binary.mzn.
+        """
+        terms = dict()
+        constant = 0
+        if old_plan is None:
+            for code, value in zip(self.grad_courses, preference):
+                terms.update(self.slot_terms(code, lambda s, u: -value))
+            return terms, constant
+        for code, old in zip(self.grad_courses, old_plan):
+            if old > 0:
+                # old away when the course is left out, abs(old - s) when taken in semester s.
+                constant = constant + old
+                terms.update(self.slot_terms(code, lambda s, u: abs(old - s) - old))
+            elif old == -1:
+                terms.update(self.slot_terms(code, lambda s, u: s))
+        return terms, constant
+
+    def preference_rows(self, preference):
+        """Rows of the hard preferences: 5 means the course is taken, 0 that it is not."""
+        rows = list()
+        for code, value in zip(self.grad_courses, preference):
+            if value == 5:
+                rows.append(row('take_' + code, self.taken_terms(code), '=', 1))
+            elif value == 0:
+                rows.append(row('skip_' + code, self.taken_terms(code), '=', 0))
+        return [added for added in rows if added is not None]
+
+    def write_lp(self, sink=None, preference=None, old_plan=None):
+        """
+        Write the linear program of one request in the LP file format.
+
+        :param sink: File-like object to write to, see ModelWriter.
+        :param preference: List of preference values, one for each grad course.
+        :param old_plan: List of old plan semesters, one for each grad course, when refining.
+        :return: The ModelWriter that was written to.
+        """
+        lp = ModelWriter(sink)
+        terms, _ = self.objective(preference, old_plan)
+        terms = {variable: coefficient for variable, coefficient in terms.items() if coefficient != 0}
+        terms = terms or {ZERO: 0}
+        rows = self.rows + self.preference_rows(preference)
+        lp.write('Minimize\n')
+        self._write_terms(lp, ' obj:', terms)
+        lp.write('Subject To\n')
+        for name, row_terms, sense, rhs in rows:
+            self._write_terms(lp, ' ' + name + ':', row_terms, ' {} {}'.format(sense, rhs))
+        lp.write('Bounds\n')
+        if ZERO in terms or any(ZERO in row_terms for _, row_terms, _, _ in rows):
+            lp.write(' ', ZERO, ' = 0\n')
+        for variable in self.variables:
+            lp.write(' 0 <= ', variable, ' <= 1\n')
+        lp.write('Binaries\n')
+        for start in range(0, len(self.variables), TERMS_PER_LINE):
+            lp.write(' ', ' '.join(self.variables[start:start + TERMS_PER_LINE]), '\n')
+        lp.write('End\n')
+        return lp
+
+    def lp_text(self, preference, old_plan=None):
+        """Return the text of the linear program of one request."""
+        return self.write_lp(None, preference, old_plan).getvalue()
+
+    @staticmethod
+    def _write_terms(lp, prefix, terms, suffix=''):
+        items = list(terms.items())
+        lp.write(prefix)
+        for start in range(0, len(items), TERMS_PER_LINE):
+            if start:
+                lp.write('\n   ')
+            for variable, coefficient in items[start:start + TERMS_PER_LINE]:
+                lp.write(' - ' if coefficient < 0 else ' + ', str(abs(coefficient)), ' ', variable)
+        lp.write(suffix, '\n')
+
+    def solution(self, chosen, preference, old_plan=None):
+        """
+        Return the plan of the given course variables with value 1 as a dict like the ones
+        general.mzn prints, {"plan": [...], "objective": ...}.
+        """
+        plan = [list() for _ in range(self.no_of_semesters)]
+        for code in self.grad_courses:
+            for variable, semester, _ in self.course_slots[code]:
+                if variable in chosen:
+                    plan[semester - 1].append(code)
+        terms, constant = self.objective(preference, old_plan)
+        objective = constant + sum(coefficient for variable, coefficient in terms.items() if variable in chosen)
+        # A new plan maximises its preferences, which CBC minimised negated.
+        if old_plan is None:
+            objective = -objective
+        return {'plan': plan, 'objective': objective}
+
+    def start_text(self, old_plan):
+        """
+        Return a solution file CBC can start its search from: every course of the old plan that
+        is not replaced, in its old semester. The replaced courses are left for CBC to fill in.
+        """
+        chosen = set()
+        for code, old in zip(self.grad_courses, old_plan):
+            slots = [variable for variable, semester, _ in self.course_slots[code] if semester == old]
+            chosen.update(slots[:1])
+        return ''.join('{} {} 1\n'.format(index, variable) for index, variable in enumerate(self.variables)
+                       if variable in chosen)
+
+    def _indexes(self):
+        """Return (the rows of every variable, the rows of course variables only)."""
+        if self._row_index is None:
+            rows_of = collections.defaultdict(list)
+            course_rows = list()
+            for index, (_, terms, _, _) in enumerate(self.rows):
+                for variable in terms:
+                    rows_of[variable].append(index)
+                if all(variable in self.slot_variables or variable == ZERO for variable in terms):
+                    course_rows.append(index)
+            self._row_index = (rows_of, course_rows)
+        return self._row_index
+
+    def satisfied(self, chosen, preference, free=()):
+        """
+        Tell whether taking the courses of the given variables, and no others, satisfies every
+        row and hard preference. The variables of the requirements are only bounded from above,
+        so they start at 1 and are lowered while a row they are in does not hold.
+
+        With free course variables, tell whether some plan taking the chosen courses and any of
+        the free ones might: a row holds if it does for some values of the free variables. If
+        not even that is the case, no such plan satisfies the rows.
+
+        :param chosen: Set of the course variables with value 1.
+        :param preference: List of preference values, one for each grad course.
+        :param free: Set of the course variables that may be 0 or 1.
+        """
+        rows_of, course_rows = self._indexes()
+        values = dict.fromkeys(self.variables, 1)
+        for variable in self.slot_variables:
+            values[variable] = 1 if variable in chosen else 0
+        values[ZERO] = 0
+
+        def holds(checked):
+            _, terms, sense, rhs = checked
+            if not free:
+                lhs = sum(coefficient * values[variable] for variable, coefficient in terms.items())
+                return lhs <= rhs if sense == '<=' else lhs >= rhs if sense == '>=' else lhs == rhs
+            low = high = 0
+            for variable, coefficient in terms.items():
+                if variable in free:
+                    low = low + min(coefficient, 0)
+                    high = high + max(coefficient, 0)
+                else:
+                    low = low + coefficient * values[variable]
+                    high = high + coefficient * values[variable]
+            return low <= rhs if sense == '<=' else high >= rhs if sense == '>=' else low <= rhs <= high
+
+        if not all(holds(added) for added in self.preference_rows(preference)):
+            return False
+        if not all(holds(self.rows[index]) for index in course_rows):
+            return False
+        worklist = list(range(len(self.rows)))
+        while worklist:
+            index = worklist.pop()
+            _, terms, sense, _ = self.rows[index]
+            if sense == '=' or holds(self.rows[index]):
+                continue
+            lowered = [variable for variable, coefficient in terms.items()
+                       if variable not in self.slot_variables and values[variable] == 1
+                       and (coefficient > 0) == (sense == '<=')]
+            if not lowered:
+                return False
+            values[lowered[0]] = 0
+            worklist.extend(rows_of[lowered[0]])
+            worklist.append(index)
+        return all(holds(added) for added in self.rows if added[2] == '=')
+
+    def repair(self, old_plan, holes, preference, limit=REPAIR_LIMIT):
+        """
+        Refine an old plan without moving any of its courses, by filling the semesters the
+        replaced courses leave with other courses. Such a plan is 0 away from the old plan, so
+        it is optimal.
+
+        Plans are first checked against the offered semesters and the units of every semester,
+        which rules out most of them before any row is evaluated.
+
+        :param old_plan: List of old plan semesters as given to objective().
+        :param holes: List of the semesters of the replaced courses, one for each.
+        :param preference: List of preference values, one for each grad course.
+        :param limit: Number of plans to try at most.
+        :return: The repaired plan as a dict like solution() returns, or None if none was found.
+        """
+        kept = {code: old for code, old in zip(self.grad_courses, old_plan) if old > 0}
+        kept_slots = dict()
+        for code, old in kept.items():
+            kept_slots[code] = [slot for slot in self.course_slots.get(code, ()) if slot[1] == old]
+            if not kept_slots[code]:
+                # The course cannot stay in its semester.
+                return None
+        # The units the kept courses can add up to in every semester, and the units left for
+        # the replacements.
+        totals = {semester: {0} for semester in range(1, self.no_of_semesters + 1)}
+        for code, old in kept.items():
+            totals[old] = {total + units for total in totals[old] for _, _, units in kept_slots[code]}
+        free = dict()
+        for semester, load in self.loads.items():
+            free[semester] = {load - total for total in totals[semester] if total <= load}
+            if semester not in holes and 0 not in free[semester]:
+                return None
+            if semester in holes and max(free[semester] or [0]) < holes.count(semester):
+                return None
+        rated = dict(zip(self.grad_courses, preference))
+        # The most preferred courses are tried first.
+        candidates = sorted((code for code, old in zip(self.grad_courses, old_plan)
+                             if old == 0 and rated[code] != 0), key=lambda code: -rated[code])
+        options = list()
+        for semester in holes:
+            room = max(free.get(semester, [self.max_units(candidates)]))
+            options.append({code: [slot for slot in self.course_slots.get(code, ())
+                                   if slot[1] == semester and slot[2] <= room]
+                            for code in candidates})
+            options[-1] = {code: slots for code, slots in options[-1].items() if slots}
+        # No plan can work if none does with every candidate free, and with several holes a
+        # candidate is only tried if a plan might work with it and the other holes free.
+        # The unit value of a kept course is free too when it has several.
+        slot_variables = lambda course_options: {variable for slots in course_options.values()
+                                                 for variable, _, _ in slots}
+        kept_variables = {slots[0][0] for slots in kept_slots.values() if len(slots) == 1}
+        kept_free = slot_variables({code: slots for code, slots in kept_slots.items() if len(slots) > 1})
+        if not self.satisfied(kept_variables, preference,
+                              kept_free.union(*[slot_variables(hole_options) for hole_options in options])):
+            return None
+        if len(holes) > 1:
+            for i, hole_options in enumerate(options):
+                others = kept_free.union(*[slot_variables(other) for other in options[:i] + options[i + 1:]])
+                options[i] = {code: slots for code, slots in hole_options.items()
+                              if self.satisfied(kept_variables, preference,
+                                                others | {variable for variable, _, _ in slots})}
+        options = [[code for code in candidates if code in hole_options] for hole_options in options]
+        tried = 0
+        for chosen_courses in itertools.product(*options):
+            if len(set(chosen_courses)) < len(chosen_courses):
+                continue
+            slots = list(kept_slots.values())
+            for code, semester in zip(chosen_courses, holes):
+                slots.append([slot for slot in self.course_slots[code] if slot[1] == semester])
+            for chosen in itertools.product(*slots):
+                units = collections.Counter()
+                for _, semester, value in chosen:
+                    units[semester] += value
+                if any(units[semester] != load for semester, load in self.loads.items()):
+                    continue
+                tried = tried + 1
+                if tried > limit:
+                    return None
+                variables = {variable for variable, _, _ in chosen}
+                if self.satisfied(variables, preference):
+                    return self.solution(variables, preference, old_plan)
+        return None
+
+    def read_solution(self, text, preference, old_plan=None):
+        """
+        Read the solution file CBC writes with its solu command.
+
+        :param text: Content of the solution file.
+        :return: A tuple (status of solver.py, solution) where the solution is a dict like the
+        ones general.mzn prints, {"plan": [...], "objective": ...}, or None.
+        """
+        lines = text.splitlines()
+        if not lines:
+            return solver.UNKNOWN, None
+        status, solved = status_of(lines[0])
+        if not solved:
+            return status, None
+        chosen = set()
+        for line in lines[1:]:
+            # Columns: index, name, value and reduced cost; ** marks a value out of its bounds.
+            fields = line.replace('**', ' ').split()
+            if len(fields) >= 3 and float(fields[2]) > 0.5:
+                chosen.add(fields[1])
+        return status, self.solution(chosen & self.slot_variables, preference, old_plan)
@@ -0,0 +1,194 @@
+"""
+    Honour Project: ANU Study Planner
+"""
+
+"""
+    In this program, we write the text of MiniZinc model (.mzn) and data (.dzn)
+    files. Fragments go straight to a file-like sink, or to an in-memory
+    buffer by default, and every array is joined in one go instead of being
+    concatenated element by element.
+
+    Data can also be written as MiniZinc JSON (.json), which MiniZinc reads
+    faster than the same data as .dzn text. Enum values are written as
+    {"e": name} objects and sets as {"set": [...]}.
+
+    A StaticModel holds everything of a model that is the same for every
+    user. Its files are written once and shared by all requests, which only
+    add a small data file of their own with the preference and old_plan
+    arrays.
+"""
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+
+# File extension MiniZinc recognises for each data format.
+DATA_EXTENSIONS = {
+    'dzn': '.dzn',
+    'json': '.json',
+    }
+
+
+def array_text(prefix, items, close='];'):
+    """
+    Return prefix followed by the items separated by commas and then close, e.g.
+    'level8 = [COMP8260, COMP8715];' or 'level8 = [];'.
+    """
+    return prefix + ', '.join(str(item) for item in items) + close
+
+
+def set_text(values):
+    """Return a MiniZinc set literal, e.g. '{1, 2}' or '{}'."""
+    return '{' + ', '.join(str(value) for value in values) + '}'
+
+
+def json_enum(values):
+    """Return enum values in MiniZinc JSON, e.g. [{"e": "COMP6250"}]."""
+    return [{'e': str(value)} for value in values]
+
+
+def json_set(values):
+    """Return a set in MiniZinc JSON, e.g. {"set": [1, 2]}."""
+    return {'set': list(values)}
+
+
+class ModelWriter:
+    """
+    Write fragments of a model or data file to a file-like sink.
+    """
+    def __init__(self, sink=None):
+        """
+        :param sink: Anything with a write(str) method, a new io.StringIO if None.
+        """
+        self.sink = sink if sink is not None else io.StringIO()
+
+    def write(self, *chunks):
+        for chunk in chunks:
+            self.sink.write(chunk)
+
+    def array(self, prefix, items, close='];', end='\n\n'):
+        """Write an array or enum, see array_text(), followed by end."""
+        self.write(array_text(prefix, items, close), end)
+
+    def set_array(self, prefix, sets, end='\n\n'):
+        """Write an array of sets, each given as an iterable of its values."""
+        self.array(prefix, [set_text(values) for values in sets], end=end)
+
+    def json(self, values):
+        """Write a dict of parameter name: value as a MiniZinc JSON data file."""
+        # json.dump would write many tiny chunks, one string is much faster.
+        self.sink.write(json.dumps(values, separators=(',', ':')))
+
+    def getvalue(self):
+        """Return the text written so far, if the sink is an in-memory buffer."""
+        return self.sink.getvalue()
+
+
+class StaticModel:
+    """
+    The parts of a model that do not depend on the user: the whole model file, and every
+    data parameter except preference and old_plan. They are the same for every request on
+    one program, specialisation, starting semester and objective (a new plan, or refining
+    an old one).
+    """
+    def __init__(self, mzn, grad_courses, refining, data_format, head, body, dropped=None):
+        """
+        :param mzn: Text of the model file.
+        :param grad_courses: List of grad courses, in the order of the preference and
+        old_plan arrays.
+        :param refining: True if the model refines an old plan, so that it needs old_plan.
+        :param data_format: 'dzn' or 'json'.
+        :param head: Data that comes before preference in a complete data file, as .dzn text
+        or as a dict of parameter name: MiniZinc JSON value.
+        :param body: Data that comes after preference, in the same form as head.
+        :param dropped: List of the grad courses presolve left out of the model, see
+        ModelCourses.
+        """
+        self.mzn = mzn
+        self.grad_courses = grad_courses
+        self.refining = refining
+        self.data_format = data_format
+        self.extension = DATA_EXTENSIONS[data_format]
+        self.head = head
+        self.body = body
+        self.dropped = dropped or list()
+        self.data = self.complete_data()
+        self.digest = hashlib.sha1((self.mzn + '\0' + self.data).encode('utf-8')).hexdigest()
+
+    def write_data(self, sink=None, preference=None, old_plan=None):
+        """
+        Write the static data, with the preference and old_plan arrays where they go in a
+        complete data file if they are given.
+
+        :param sink: File-like object to write to, see ModelWriter.
+        :param preference: List of preference values, one for each grad course.
+        :param old_plan: List of old plan semesters, one for each grad course.
+        :return: The ModelWriter that was written to.
+        """
+        data = ModelWriter(sink)
+        if self.data_format == 'dzn':
+            if old_plan is not None:
+                data.array('old_plan = [', old_plan)
+            data.write(self.head)
+            if preference is not None:
+                data.array('preference = [', preference)
+            data.write(self.body)
+        else:
+            values = dict()
+            if old_plan is not None:
+                values['old_plan'] = old_plan
+            values.update(self.head)
+            if preference is not None:
+                values['preference'] = preference
+            values.update(self.body)
+            data.json(values)
+        return data
+
+    def complete_data(self, preference=None, old_plan=None):
+        """Return the text of the static data file, or of a complete one if the arrays are given."""
+        return self.write_data(None, preference, old_plan).getvalue()
+
+    def request_data(self, preference, old_plan=None):
+        """
+        Return the text of the data file of one request, holding only the preference array,
+        and the old_plan array when refining.
+        """
+        data = ModelWriter()
+        if self.data_format == 'dzn':
+            if old_plan is not None:
+                data.array('old_plan = [', old_plan)
+            data.array('preference = [', preference)
+        else:
+            values = dict()
+            if old_plan is not None:
+                values['old_plan'] = old_plan
+            values['preference'] = preference
+            data.json(values)
+        return data.getvalue()
+
+    def write_files(self, directory):
+        """
+        Write the model and static data files into directory, named after their content so
+        that models of different programs never clash. Files that already exist are left
+        as they are.
+
+        :return: A tuple (model path, data path).
+        """
+        os.makedirs(directory, exist_ok=True)
+        model_path = os.path.join(directory, self.digest + '.mzn')
+        data_path = os.path.join(directory, self.digest + self.extension)
+        for path, text in ((model_path, self.mzn), (data_path, self.data)):
+            if os.path.exists(path):
+                continue
+            # Write to a temporary file first so that a solver never reads half a file.
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as model_file:
+                    model_file.write(text)
+                os.replace(temp_path, path)
+            except Exception:
+                os.remove(temp_path)
+                raise
+        return model_path, data_path
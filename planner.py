@@ -0,0 +1,626 @@
+"""
+    Honour Project: ANU Study Planner
+"""
+
+"""
+    In this program, we run a planning request from the beginning to the end:
+    scrape the program orders, build a MiniZinc model for them, solve it and
+    read the plan from the output of the solver. Every request keeps its own data and solver output (in
+    memory or in a private temporary directory), so that several requests can
+    be planned at the same time by one process.
+
+    The model and most of its data only depend on the program, specialisation,
+    starting semester and whether an old plan is refined. They are built once
+    as a StaticModel, whose files are written under MODEL_DIR and shared by
+    all requests; a request only writes its preference and old plan.
+
+    Every solve has a deadline. When it passes, the best plan MiniZinc found so
+    far is returned and reported as "timed out with incumbent" rather than
+    "optimal".
+
+    With the cbc backend the model is built as a linear program instead and
+    CBC solves it without MiniZinc, which spares flattening the model.
+
+    Re-planning starts from the old plan. The linear program first checks
+    whether the replaced courses can simply be swapped for others in the same
+    semesters, which is optimal and needs no solver at all; otherwise the
+    solver gets the courses that are kept as a warm start.
+
+    With a portfolio of solvers, every installed solver of the portfolio works
+    on the same model at the same time. The first one to prove its plan
+    optimal wins and the others are killed; at the deadline the best plan any
+    of them found wins. The winners are logged to tune the portfolio.
+"""
+
+import collections
+import functools
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import data_process as dp
+import fetch
+import solver
+from cache import CACHE_DIR, LRUCache, TieredCache, disk_store
+from model_writer import DATA_EXTENSIONS
+
+# general.mzn is included by every generated model, so MiniZinc has to be able
+# to find it from any working directory.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROGRAM_URL = 'https://programsandcourses.anu.edu.au/{}/program/{}'
+PROGRAM_YEAR = '2019'
+MINIZINC = 'minizinc'
+SOLVER = 'OSICBC'
+# Solvers raced on every model, e.g. "OSICBC,Gecode,Chuffed". Only the installed
+# ones are used, and SOLVER alone when fewer than two of them are.
+PORTFOLIO = [name.strip() for name in os.environ.get('PLANNER_PORTFOLIO', '').split(',') if name.strip()]
+# Set PLANNER_BACKEND=cbc to solve plans as linear programs with CBC directly,
+# without MiniZinc, see linear_model.py. MiniZinc is used when CBC is not installed.
+BACKEND = os.environ.get('PLANNER_BACKEND', 'minizinc')
+CBC = os.environ.get('PLANNER_CBC', 'cbc')
+# no_of_semesters in general.mzn.
+NO_OF_SEMESTERS = 4
+# Seconds a solve may take by default, and at most when a request asks for more.
+SOLVE_TIMEOUT = float(os.environ.get('PLANNER_SOLVE_TIMEOUT', 30))
+MAX_SOLVE_TIMEOUT = float(os.environ.get('PLANNER_MAX_SOLVE_TIMEOUT', 120))
+# MiniZinc stops itself at the deadline and prints its best solution, it is
+# only killed if it is still running this many seconds later.
+KILL_GRACE = 5
+# Resource limits of the solver process: CPU seconds on top of the deadline,
+# and megabytes of memory.
+SOLVER_CPU_MARGIN = int(os.environ.get('PLANNER_SOLVER_CPU_MARGIN', 30))
+SOLVER_MEMORY_MB = int(os.environ.get('PLANNER_SOLVER_MEMORY_MB', 2048))
+
+# Every portfolio race is logged as one line of JSON to this file.
+if CACHE_DIR:
+    PORTFOLIO_LOG = os.environ.get('PLANNER_PORTFOLIO_LOG', os.path.join(CACHE_DIR, 'portfolio.jsonl'))
+else:
+    PORTFOLIO_LOG = os.environ.get('PLANNER_PORTFOLIO_LOG', '')
+
+# Status of a plan, as reported to the front end.
+PLAN_OPTIMAL = 'optimal'
+PLAN_INCUMBENT = 'timed out with incumbent'
+PLAN_TIMED_OUT = 'timed out'
+PLAN_INFEASIBLE = 'unsatisfiable'
+# Only these plans are final, the others may improve with more time.
+FINAL_STATUSES = (PLAN_OPTIMAL, PLAN_INFEASIBLE)
+# Format of the data handed to MiniZinc: 'dzn', or 'json' which MiniZinc parses faster.
+DATA_FORMAT = os.environ.get('PLANNER_DATA_FORMAT', 'dzn')
+# Leave the courses that can never be taken out of the models, see presolve.py.
+PRESOLVE = os.environ.get('PLANNER_PRESOLVE', '1') != '0'
+# Formulation of the models when a request does not ask for one, see dp.FORMULATIONS.
+FORMULATION = os.environ.get('PLANNER_FORMULATION', 'integer')
+# Set PLANNER_WARM_START=1 to start MiniZinc from the old plan when re-planning. The
+# warm_start annotation needs MiniZinc 2.5 or later.
+WARM_START = os.environ.get('PLANNER_WARM_START', '0') == '1'
+
+# Version of the static and linear models, part of their cache keys. Bump it whenever
+# the model text or the pickled classes change, so that cached models are rebuilt.
+MODEL_FORMAT = 4
+
+# Program rules change at most once a year, a week old copy is good enough.
+PROGRAM_ORDERS_TTL = int(os.environ.get('PLANNER_PROGRAM_TTL', 7 * 24 * 3600))
+PLAN_CACHE_SIZE = int(os.environ.get('PLANNER_PLAN_CACHE_SIZE', 256))
+# Solved plans are only written to disk when PLANNER_PERSIST_PLANS is set.
+PERSIST_PLANS = bool(os.environ.get('PLANNER_PERSIST_PLANS'))
+STATIC_MODEL_CACHE_SIZE = int(os.environ.get('PLANNER_STATIC_MODEL_CACHE_SIZE', 64))
+# Files of the static models, named after their content. They go to the
+# temporary directory of the system when the on-disk cache is turned off.
+if CACHE_DIR:
+    MODEL_DIR = os.path.join(CACHE_DIR, 'models')
+else:
+    MODEL_DIR = os.path.join(tempfile.gettempdir(), 'planner-models')
+
+
+# Parsed ProgramOrder trees, keyed by (program link, year, page source). The
+# trees are shared by all requests, so they must be treated as read-only.
+program_orders_cache = TieredCache(LRUCache(32, PROGRAM_ORDERS_TTL),
+                                  disk_store('program_orders', PROGRAM_ORDERS_TTL))
+# Static models, keyed by (program link, year, page source, sem, spec, refining, data format,
+# presolve, formulation, warm start, catalog, model format), and linear models, keyed by (program link,
+# year, page source, sem, spec, 'lp', presolve, catalog, model format).
+static_model_cache = TieredCache(LRUCache(STATIC_MODEL_CACHE_SIZE, PROGRAM_ORDERS_TTL),
+                                disk_store('static_models', PROGRAM_ORDERS_TTL))
+# Solved plans, keyed by plan_key() of the planning inputs.
+plan_cache = TieredCache(LRUCache(PLAN_CACHE_SIZE, PROGRAM_ORDERS_TTL),
+                        disk_store('plans', PROGRAM_ORDERS_TTL) if PERSIST_PLANS else None)
+
+
+def semester_type(enroll_yr, enroll_sem):
+    """
+        Calculate which type of semester does the enrolled semester fall in:
+        S1 in odd year, S2 in odd year, S1 in even year or S2 in even year.
+    """
+    if int(enroll_yr)%2 == 1:
+        if int(enroll_sem)%2 == 1:
+            return 1
+        return 2
+    if int(enroll_sem)%2 == 1:
+        return 3
+    return 4
+
+
+def program_link(program, year=PROGRAM_YEAR):
+    """
+        Build the P&C link for a program code, e.g. 7706XMCOMP.
+    """
+    return PROGRAM_URL.format(year, program)
+
+
+def get_program_orders(program, year=PROGRAM_YEAR):
+    """
+        Return the ProgramOrder tree of a program, scraping P&C only when it is
+        not in the cache (or the cached copy has expired).
+    """
+    link = program_link(program, year)
+    return program_orders_cache.get_or_compute(
+            (link, str(year), fetch.source()),
+            lambda: dp.DegreeRuleScraper(link).build_program_order_struct()
+            )
+
+
+def invalidate_program(program, year=PROGRAM_YEAR):
+    """
+        Drop the cached ProgramOrder tree of a program, e.g. after its rules changed.
+    """
+    program_orders_cache.invalidate((program_link(program, year), str(year), fetch.source()))
+    # Static models are also keyed by semester and specialisation, simply drop them all.
+    static_model_cache.clear()
+
+
+def get_static_model(program, sem, spec=0, refining=False, year=PROGRAM_YEAR, formulation=None):
+    """
+        Return the StaticModel of a program, building it from the program orders
+        only when it is not in the cache.
+    """
+    link = program_link(program, year)
+    formulation = model_formulation(formulation)
+    return static_model_cache.get_or_compute(
+            (link, str(year), fetch.source(), int(sem), int(spec), bool(refining), DATA_FORMAT, PRESOLVE,
+             formulation, WARM_START, dp.CATALOG_DIGEST, MODEL_FORMAT),
+            lambda: get_program_orders(program, year).build_static_model(sem, spec, refining, DATA_FORMAT,
+                                                                         PRESOLVE, formulation, WARM_START)
+            )
+
+
+def get_linear_model(program, sem, spec=0, year=PROGRAM_YEAR):
+    """
+        Return the LinearModel of a program, building it from the program orders
+        only when it is not in the cache.
+    """
+    link = program_link(program, year)
+    return static_model_cache.get_or_compute(
+            (link, str(year), fetch.source(), int(sem), int(spec), 'lp', PRESOLVE, dp.CATALOG_DIGEST,
+             MODEL_FORMAT),
+            lambda: get_program_orders(program, year).build_linear_model(sem, spec, PRESOLVE)
+            )
+
+
+def direct_backend():
+    """
+        Tell whether plans are solved by CBC directly: with the cbc backend,
+        when CBC is installed.
+    """
+    return BACKEND == 'cbc' and shutil.which(CBC) is not None
+
+
+def build_model(program, sem, spec=0, preference=None, old_plan=None, replaced=None, formulation=None):
+    """
+        Get the static model and build the data of one request.
+
+        :return: A tuple (StaticModel, data) where data is the text of the data file holding
+        the preference and old plan of this request only, in DATA_FORMAT
+    """
+    static = get_static_model(program, sem, spec, bool(replaced), formulation=formulation)
+    old_plan_values = None
+    if replaced:
+        old_plan_values = dp.old_plan_array(static.grad_courses, old_plan or {}, replaced)
+    return static, static.request_data(dp.preference_array(static.grad_courses, preference or {}),
+                                       old_plan_values)
+
+
+def solve_timeout(timeout=None):
+    """
+        Return the deadline of a solve in seconds: SOLVE_TIMEOUT if the request
+        did not ask for one, otherwise what it asked for up to MAX_SOLVE_TIMEOUT.
+    """
+    if timeout is None or timeout == '':
+        return SOLVE_TIMEOUT
+    try:
+        seconds = float(timeout)
+    except (TypeError, ValueError):
+        seconds = math.nan
+    if math.isnan(seconds):
+        raise ValueError('Invalid timeout {!r}, give the seconds the solver may search for'.format(timeout))
+    return min(max(seconds, 1.0), MAX_SOLVE_TIMEOUT)
+
+
+def model_formulation(formulation=None):
+    """
+        Return the formulation of a model: FORMULATION if the request did not ask
+        for one, otherwise the one it asked for if there is such a formulation.
+    """
+    if formulation is None or formulation == '':
+        return FORMULATION
+    if not isinstance(formulation, str) or formulation not in dp.FORMULATIONS:
+        raise ValueError('Unknown formulation {}, use one of {}'.format(
+                formulation, ', '.join(sorted(dp.FORMULATIONS))))
+    return formulation
+
+
+@functools.lru_cache(maxsize=None)
+def installed_solvers():
+    """
+        Return the lower-cased ids, names and tags of the solvers MiniZinc has
+        installed, or None if MiniZinc cannot tell.
+    """
+    try:
+        listing = subprocess.run([MINIZINC, '--solvers-json'], stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE, universal_newlines=True)
+        solvers = json.loads(listing.stdout)
+    except (OSError, ValueError):
+        return None
+    names = set()
+    for description in solvers:
+        solver_id = description.get('id', '')
+        names.update([solver_id, solver_id.split('.')[-1], description.get('name', '')])
+        names.update(description.get('tags', []))
+    return frozenset(name.lower() for name in names if name)
+
+
+def portfolio_solvers():
+    """
+        Return the solvers to run on every model: the installed solvers of
+        PORTFOLIO if there are at least two, otherwise SOLVER alone.
+    """
+    if len(PORTFOLIO) < 2:
+        return [SOLVER]
+    installed = installed_solvers()
+    solvers = [name for name in PORTFOLIO if installed is None or name.lower() in installed]
+    return solvers if len(solvers) >= 2 else [SOLVER]
+
+
+def run_solver(name, files, workspace, timeout, cancelled=None):
+    """
+        Run MiniZinc with one solver on the model and data files.
+
+        :return: A solver.SolverResult
+    """
+    # -a prints every improving solution, so the best one so far is known at any time.
+    cmd = [MINIZINC, '--solver', name, '-a', '--time-limit', str(int(timeout * 1000)),
+           '-I', BASE_DIR] + list(files)
+    result = solver.run(cmd, cwd=workspace, timeout=timeout + KILL_GRACE, cancelled=cancelled,
+                        cpu_seconds=math.ceil(timeout) + SOLVER_CPU_MARGIN,
+                        memory_bytes=SOLVER_MEMORY_MB * 1024 * 1024)
+    result.solver = name
+    return result
+
+
+def race(solvers, files, workspace, timeout, cancelled, minimize):
+    """
+        Run several solvers on the same model at once. The first result proven
+        optimal (or proven to have no plan) wins and the other solvers are
+        killed. If none finishes its search, the best plan found by any of them
+        wins.
+
+        :param minimize: True if the model minimises its objective, False if it maximises it
+        :return: A tuple (the winning solver.SolverResult, list of all results)
+    """
+    decided = threading.Event()
+    stop = lambda: decided.is_set() or (cancelled is not None and cancelled())
+    results = list()
+    winner = None
+    with ThreadPoolExecutor(max_workers=len(solvers)) as pool:
+        runs = [pool.submit(run_solver, name, files, workspace, timeout, stop) for name in solvers]
+        for finished in as_completed(runs):
+            try:
+                result = finished.result()
+            except OSError:
+                # The solver could not be started at all.
+                continue
+            results.append(result)
+            if winner is None and result.status in (solver.OPTIMAL, solver.UNSATISFIABLE):
+                winner = result
+                decided.set()
+    if winner is None:
+        incumbents = [result for result in results if result.solution is not None]
+        objective = lambda result: result.solution.get('objective', 0)
+        if incumbents:
+            winner = (min if minimize else max)(incumbents, key=objective)
+        elif results:
+            winner = results[0]
+    if winner is None:
+        raise RuntimeError('No solver of the portfolio could be run')
+    return winner, results
+
+
+portfolio_lock = threading.Lock()
+# Number of races won by every solver since the server started.
+portfolio_wins = collections.Counter()
+
+
+def record_race(static, winner, results):
+    """
+        Count the winner of a portfolio race, and log the race to PORTFOLIO_LOG.
+    """
+    entry = {
+        'time': time.time(),
+        'model': static.digest,
+        'refining': static.refining,
+        'winner': winner.solver,
+        'status': plan_status(winner),
+        'solvers': {result.solver: {'status': result.status, 'elapsed': round(result.elapsed, 3)}
+                    for result in results},
+        }
+    with portfolio_lock:
+        portfolio_wins[winner.solver] += 1
+        if PORTFOLIO_LOG:
+            with open(PORTFOLIO_LOG, 'a') as log_file:
+                log_file.write(json.dumps(entry, sort_keys=True) + '\n')
+
+
+def portfolio_summary(path=None):
+    """
+        Count the races each solver won in the portfolio log.
+
+        :return: A collections.Counter of solver name: races won
+    """
+    wins = collections.Counter()
+    path = path or PORTFOLIO_LOG
+    if not path or not os.path.exists(path):
+        return wins
+    with open(path) as log_file:
+        for line in log_file:
+            if line.strip():
+                wins[json.loads(line)['winner']] += 1
+    return wins
+
+
+def solve(static, data, timeout=None, cancelled=None):
+    """
+        Call MiniZinc to solve for the model. The static model files are shared,
+        the data of this request is written into a temporary directory owned by
+        this call only, and the solutions are read from the standard output of
+        the solver while it runs. With a portfolio, its solvers race each other.
+
+        :param timeout: Seconds MiniZinc may search for, SOLVE_TIMEOUT if None
+        :param cancelled: Optional function returning True once nobody waits for the
+        plan any more, the solver is then killed
+        :return: A solver.SolverResult, whose solver attribute names the solver that
+        found the plan
+    """
+    timeout = solve_timeout(timeout)
+    solvers = portfolio_solvers()
+    model_path, static_data_path = static.write_files(MODEL_DIR)
+    with tempfile.TemporaryDirectory(prefix='plan-') as workspace:
+        data_path = os.path.join(workspace, 'request' + static.extension)
+        with open(data_path, 'w') as data_file:
+            data_file.write(data)
+        files = (model_path, static_data_path, data_path)
+        if len(solvers) == 1:
+            result = run_solver(solvers[0], files, workspace, timeout, cancelled)
+        else:
+            result, results = race(solvers, files, workspace, timeout, cancelled, static.refining)
+            if not (cancelled is not None and cancelled()):
+                record_race(static, result, results)
+    if result.returncode != 0 and result.solution is None and not (result.timed_out or result.cancelled):
+        raise RuntimeError('MiniZinc failed: {}'.format(result.stderr.strip()))
+    return result
+
+
+def unavailable_courses(model, preference):
+    """
+        Return the courses a request insists on taking (preference 5) that
+        presolve left out of a model, as they can never be taken. There is no
+        plan for such a request, as there was none while they were in the model.
+
+        :param model: A StaticModel or LinearModel
+    """
+    hard = dp.preference_array(model.dropped, preference or {})
+    return [course for course, value in zip(model.dropped, hard) if value == 5]
+
+
+def repair_plan(program, sem, spec=0, preference=None, old_plan=None, replaced=None):
+    """
+        Refine an old plan by swapping its replaced courses for other courses in
+        the same semesters, see LinearModel.repair(). No plan is closer to the
+        old plan, so when the swap is possible no solver needs to run.
+
+        :return: A solution like the ones general.mzn prints, or None
+    """
+    linear = get_linear_model(program, sem, spec)
+    old_plan = old_plan or {}
+    holes = [old_plan[course] for course in replaced if old_plan.get(course, 0) > 0]
+    return linear.repair(dp.old_plan_array(linear.grad_courses, old_plan, replaced), holes,
+                         dp.preference_array(linear.grad_courses, preference or {}))
+
+
+def solve_linear(linear, preference, old_plan=None, timeout=None, cancelled=None):
+    """
+        Solve the linear program of one request with CBC. It is written into a
+        temporary directory owned by this call, and CBC writes its solution
+        there at the end of the search or at the deadline. A refined plan starts
+        from the courses of the old plan that are kept.
+
+        :param preference: List of preference values, one for each grad course
+        :param old_plan: List of old plan semesters when refining, otherwise None
+        :return: A solver.SolverResult like solve() returns
+    """
+    timeout = solve_timeout(timeout)
+    with tempfile.TemporaryDirectory(prefix='plan-') as workspace:
+        lp_path = os.path.join(workspace, 'plan.lp')
+        solution_path = os.path.join(workspace, 'plan.sol')
+        with open(lp_path, 'w') as lp_file:
+            linear.write_lp(lp_file, preference, old_plan)
+        cmd = [CBC, lp_path, 'sec', str(int(math.ceil(timeout))), 'solve', 'solu', solution_path]
+        if old_plan is not None:
+            start_path = os.path.join(workspace, 'start.sol')
+            with open(start_path, 'w') as start_file:
+                start_file.write(linear.start_text(old_plan))
+            cmd[2:2] = ['mips', start_path]
+        result = solver.run(cmd, cwd=workspace, timeout=timeout + KILL_GRACE, cancelled=cancelled,
+                            cpu_seconds=math.ceil(timeout) + SOLVER_CPU_MARGIN,
+                            memory_bytes=SOLVER_MEMORY_MB * 1024 * 1024)
+        result.solver = 'cbc'
+        if os.path.exists(solution_path):
+            with open(solution_path) as solution_file:
+                result.status, result.solution = linear.read_solution(solution_file.read(), preference,
+                                                                      old_plan)
+    if result.returncode != 0 and result.solution is None and not (result.timed_out or result.cancelled):
+        raise RuntimeError('CBC failed: {}'.format(result.stderr.strip()))
+    return result
+
+
+def plan_status(result):
+    """
+        Tell how the search for a plan ended: optimal, stopped at the deadline with
+        or without a plan, or without any plan possible.
+    """
+    if result.status == solver.OPTIMAL:
+        return PLAN_OPTIMAL
+    if result.status == solver.UNSATISFIABLE:
+        return PLAN_INFEASIBLE
+    if result.solution is not None:
+        return PLAN_INCUMBENT
+    return PLAN_TIMED_OUT
+
+
+def read_plan(solution):
+    """
+        Convert a solution printed by our model, e.g. {"plan": [["COMP6250"], ...]},
+        into the plan shown in our GUI: one dict per semester mapping c1, c2, ...
+        to the courses taken in it. Without a solution every semester is empty.
+    """
+    if solution is None:
+        semesters = [[]] * NO_OF_SEMESTERS
+    else:
+        semesters = solution['plan']
+    plan = list()
+    for number, courses in enumerate(semesters, 1):
+        semester = {'semester': 'S' + str(number)}
+        for index, course in enumerate(courses, 1):
+            semester['c' + str(index)] = str(course)
+        plan.append(semester)
+    return plan
+
+
+def old_plan_from_table(table):
+    """
+        Rebuild the old plan (course -> semester) from the plan shown in the
+        table of our GUI, which is sent back to us when updating it.
+
+        :raises ValueError: If there is no table, or a row of it has no semester
+    """
+    if not isinstance(table, list) or not table:
+        raise ValueError('No plan to update, send the plan shown in the table')
+    oldPlan = dict()
+    for row in table:
+        semester = re.findall(r'\d', str(row.get('semester'))) if isinstance(row, dict) else None
+        if not semester:
+            raise ValueError('Invalid row {!r} in the plan to update, each row needs a semester'.format(row))
+        current = int(semester[0])
+        for key in row:
+            if key != 'semester':
+                oldPlan[str(row[key])] = current
+    return oldPlan
+
+
+def plan_key(program, sem, spec=0, preference=None, old_plan=None, replaced=None, formulation=None):
+    """
+        Build a canonical hash of the inputs of a planning request, so that two
+        requests which lead to the same model share the same key.
+
+        Preference values are scaled the same way as in buildAModel, and the ones
+        equal to the default preference are dropped. The old plan only matters
+        when some courses are replaced.
+    """
+    scaled = dict()
+    for course, value in (preference or {}).items():
+        if not re.match(dp.COURSE_REGEX + '$', str(course)):
+            continue
+        value = int(float(value)*5)
+        if value != dp.DEFAULT_PREFERENCE:
+            scaled[course] = value
+    if replaced:
+        old_plan = sorted((str(course), int(value)) for course, value in (old_plan or {}).items())
+        replaced = sorted(set(replaced))
+    else:
+        old_plan = None
+        replaced = None
+    inputs = {
+        # Plans are cached with their status since format 2.
+        'format': 2,
+        'program': program_link(program),
+        'sem': int(sem),
+        'spec': int(spec),
+        'formulation': model_formulation(formulation),
+        'solver': 'cbc' if direct_backend() else ','.join(PORTFOLIO) if len(PORTFOLIO) >= 2 else SOLVER,
+        'source': fetch.source(),
+        'catalog': dp.CATALOG_DIGEST,
+        'model': MODEL_FORMAT,
+        'preference': scaled,
+        'old_plan': old_plan,
+        'replaced': replaced,
+        }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def make_plan(program, sem, spec=0, preference=None, old_plan=None, replaced=None, timeout=None,
+              formulation=None, cancelled=None):
+    """
+        Plan for one request. Plans already solved for the same inputs are
+        returned from the cache, and identical requests arriving while one is
+        being solved wait for it rather than starting another MiniZinc process.
+        Plans cut short by the deadline are not cached, a later request may
+        find a better one. Only requests with the same timeout wait for each
+        other, as they share its deadline. The solver is only killed once every
+        waiting request was cancelled. A refined plan is repaired without a
+        solver when swapping its replaced courses is enough.
+
+        :param timeout: Seconds the solver may search for, see solve_timeout()
+        :param formulation: Formulation of the model, see model_formulation()
+        :param cancelled: Optional function returning True once nobody waits for the
+        plan any more
+        :return: A dict with the plan as a list of semesters, and its status. A request
+        insisting on courses that can never be taken has no plan, and the courses are
+        listed as unavailable.
+    """
+    timeout = solve_timeout(timeout)
+
+    def solve_plan(cancelled=None):
+        if replaced or direct_backend():
+            model = get_linear_model(program, sem, spec)
+        else:
+            model = get_static_model(program, sem, spec, formulation=formulation)
+        unavailable = unavailable_courses(model, preference)
+        if unavailable:
+            return {'plan': read_plan(None), 'status': PLAN_INFEASIBLE, 'solver': 'presolve',
+                    'unavailable': unavailable}
+        repaired = repair_plan(program, sem, spec, preference, old_plan, replaced) if replaced else None
+        if repaired is not None:
+            return {'plan': read_plan(repaired), 'status': PLAN_OPTIMAL, 'solver': 'repair'}
+        if direct_backend():
+            linear = get_linear_model(program, sem, spec)
+            old_plan_values = None
+            if replaced:
+                old_plan_values = dp.old_plan_array(linear.grad_courses, old_plan or {}, replaced)
+            result = solve_linear(linear, dp.preference_array(linear.grad_courses, preference or {}),
+                                  old_plan_values, timeout, cancelled)
+        else:
+            static, data = build_model(program, sem, spec, preference, old_plan, replaced, formulation)
+            result = solve(static, data, timeout, cancelled)
+        return {'plan': read_plan(result.solution), 'status': plan_status(result),
+                'solver': result.solver}
+
+    key = plan_key(program, sem, spec, preference, old_plan, replaced, formulation)
+    return plan_cache.get_or_compute(key, solve_plan, keep=lambda plan: plan['status'] in FINAL_STATUSES,
+                                     cancelled=cancelled, flight_key=(key, timeout))
+
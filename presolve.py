@@ -0,0 +1,108 @@
+"""
+    Honour Project: ANU Study Planner
+"""
+
+"""
+    In this program, we presolve a model before it is written: we find the
+    courses which can never be taken in a plan and leave them out, so that
+    MiniZinc neither creates variables for them nor flattens constraints
+    about them.
+
+    A course can never be taken when it is not offered in any semester the
+    plan covers, when its corequisite can never be taken, or when none of the
+    courses of one of its prerequisite clauses can be taken. Undergrad
+    courses are never taken at all, so an incompatibility with one of them
+    never matters and they need not be in the model either.
+
+    Prerequisites also order the courses: a course whose longest chain of
+    prerequisites is d courses long cannot be taken before semester d + 1 of
+    the plan. We compute the earliest and latest semester of every course
+    from its prerequisites and offerings, and the model restricts takes to
+    them. Courses on a prerequisite cycle, or at the end of a chain longer
+    than the plan, get no semester at all and are left out like the others.
+"""
+
+import numpy as np
+
+from catalog import NO_COURSE
+
+# Values of the semesters enum of general.mzn, in order.
+SEMESTER_NAMES = ['odd_first', 'odd_second', 'even_first', 'even_second']
+# no_of_semesters in general.mzn.
+NO_OF_SEMESTERS = 4
+
+
+def semester_name(start_semester, taken):
+    """
+    Return the name of semester taken (counted from 1) of a plan starting in start_semester,
+    as the Offerings constraint of general.mzn maps it.
+    """
+    return SEMESTER_NAMES[(int(start_semester) - 1 + taken - 1) % len(SEMESTER_NAMES)]
+
+
+def semester_bounds(catalog, grad_courses, semester_table, start_semester,
+                    no_of_semesters=NO_OF_SEMESTERS):
+    """
+    Find the earliest and latest semester of the plan each grad course can be taken in.
+
+    A course can be taken in a semester it is offered in, after one course of each of its
+    prerequisite clauses and not before its corequisite, all of them grad courses that can
+    be taken themselves. The earliest semesters only grow while they are computed, and a
+    course whose earliest semester passes the end of the plan can never be taken; this also
+    ends the computation for courses on a cycle. Courses are visited in order of the size of
+    their requisite closures, so a course comes after every course it requires unless they
+    are on a cycle, and the bounds of courses without cycles settle in a single pass.
+
+    :param catalog: The CourseCatalog holding the requisites.
+    :param grad_courses: List of grad course codes.
+    :param semester_table: Dict of course code: semesters it is offered in, like SEMESTER.
+    :param start_semester: The semester the plan starts in.
+    :return: Dict of course code: (earliest, latest) semester of the plan, counted from 1,
+    for the courses that can be taken.
+    """
+    slots = dict()
+    for c in grad_courses:
+        offered = set(semester_table.get(c) or ())
+        slots[catalog.ids[c]] = [taken for taken in range(1, no_of_semesters + 1)
+                                 if semester_name(start_semester, taken) in offered]
+    earliest = {i: options[0] for i, options in slots.items() if options}
+    order = sorted(earliest, key=lambda i: (len(catalog.required_closure[i]), i))
+    changed = True
+    while changed:
+        changed = False
+        for i in order:
+            if i not in earliest:
+                continue
+            needed = 1
+            for clause in catalog.prereq[i]:
+                alternatives = [earliest[r] for r in clause if r in earliest]
+                if alternatives:
+                    needed = max(needed, min(alternatives) + 1)
+                elif any(r != NO_COURSE for r in clause):
+                    needed = None
+                    break
+            for r in catalog.coreq[i].ravel():
+                if needed is not None and r != NO_COURSE:
+                    needed = max(needed, earliest[r]) if r in earliest else None
+            options = [taken for taken in slots[i] if needed is not None and taken >= needed]
+            if not options:
+                del earliest[i]
+                changed = True
+            elif options[0] != earliest[i]:
+                earliest[i] = options[0]
+                changed = True
+    return {catalog.codes[i]: (earliest[i], slots[i][-1]) for i in earliest}
+
+
+def pruned_requisites(catalog, table, grad_ids, takeable_ids):
+    """
+    Look up the requisites of the given courses, with NO_COURSE in place of every course
+    that cannot be taken.
+
+    :param table: One of catalog.prereq, catalog.coreq or catalog.incompat.
+    :param grad_ids: Array of the ids of the courses in the model.
+    :param takeable_ids: Array of the ids of the courses that can be taken.
+    :return: Object array of course codes, None for an empty slot, as catalog.decode().
+    """
+    requisites = table[grad_ids]
+    return catalog.decode(np.where(np.isin(requisites, takeable_ids), requisites, NO_COURSE))
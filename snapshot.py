@@ -0,0 +1,185 @@
+"""
+    Honour Project: ANU Study Planner
+"""
+
+"""
+    In this program, we build and read offline snapshots of the Programs &
+    Courses website. A snapshot holds the pages of a set of programs, every
+    major/minor/specialisation they link to, and the pages of the courses
+    listed on them, in a versioned directory:
+
+        <root>/<version>/manifest.json
+        <root>/<version>/pages/2019/program/7706XMCOMP.html
+        <root>/<version>/pages/2019/course/COMP6250.html
+        <root>/LATEST                      (name of the newest version)
+
+    When a snapshot is in use (see fetch.use_snapshot), every page the
+    scrapers ask for is read from it and the network is never touched.
+
+    Usage:
+        python snapshot.py 7706XMCOMP [more program codes] --year 2019 --root snapshots
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from urllib.parse import urljoin, urlparse
+except:
+    from urlparse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+
+import fetch
+
+PANDC_URL = 'https://programsandcourses.anu.edu.au/'
+PAGE_REGEX = r'^/?(?P<year>\d{4})/(?P<page_type>program|major|minor|specialisation|course)/' \
+             r'(?P<code>[A-Za-z\d-]+)/?$'
+# Pages of these types are searched for further links, course pages are not.
+FOLLOWED_TYPES = {'program', 'major', 'minor', 'specialisation'}
+MANIFEST = 'manifest.json'
+LATEST = 'LATEST'
+
+
+class PageNotInSnapshot(LookupError):
+    """Raised for a P&C page that is not in the snapshot."""
+
+
+def page_key(url, year=None):
+    """
+    Reduce a P&C URL to the key used in a snapshot, e.g. '2019/course/COMP6250'.
+
+    :param url: Absolute or relative URL of a P&C page.
+    :param year: Year to use for URLs without one, such as the default course URL.
+    :return: The key, or None if the URL is not a program, subplan or course page.
+    """
+    path = urlparse(url).path.strip('/')
+    if year is not None and not re.match(r'\d{4}/', path):
+        path = '{}/{}'.format(year, path)
+    if not re.match(PAGE_REGEX, path):
+        return None
+    return path
+
+
+class Snapshot:
+    """
+    Read pages from a snapshot directory.
+    """
+    def __init__(self, directory):
+        """
+        :param directory: A snapshot version directory, or a root directory whose LATEST file
+        names the version to use.
+        """
+        if not os.path.exists(os.path.join(directory, MANIFEST)):
+            with open(os.path.join(directory, LATEST)) as latest_file:
+                directory = os.path.join(directory, latest_file.read().strip())
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST)) as manifest_file:
+            self.manifest = json.load(manifest_file)
+        self.version = self.manifest['version']
+        self.year = self.manifest['year']
+        self.pages = self.manifest['pages']
+
+    def __repr__(self):
+        return 'Snapshot({}, version={})'.format(self.directory, self.version)
+
+    def get(self, url):
+        """
+        Return the body of a page in the snapshot as bytes.
+
+        :raises ValueError: The URL is not a P&C page. Like the errors requests raises for
+        what is not a URL, this lets the scrapers try it as a local file instead.
+        :raises PageNotInSnapshot: The page is not in the snapshot.
+        """
+        key = page_key(url, self.year)
+        if key is None:
+            raise ValueError('{} is not a Programs & Courses page'.format(url))
+        if key not in self.pages:
+            raise PageNotInSnapshot('{} is not in snapshot {}'.format(url, self.version))
+        with open(os.path.join(self.directory, self.pages[key]), 'rb') as page_file:
+            return page_file.read()
+
+
+def get_page_links(html, base_url, year):
+    """
+    Find the links to program, subplan and course pages in the study block of a page.
+
+    :param year: Year of the pages linked without one.
+    :return: Dict of snapshot key: absolute URL.
+    """
+    soup = BeautifulSoup(html, 'html5lib')
+    block = soup.find(id='study') or soup
+    links = dict()
+    for anchor in block.find_all('a', href=True):
+        url = urljoin(base_url, anchor['href'])
+        key = page_key(url, year)
+        if key is not None:
+            links[key] = url
+    return links
+
+
+def build_snapshot(program_codes, year, root, version=None, workers=8):
+    """
+    Crawl programs with all their subplans and courses into a new snapshot version.
+
+    :param program_codes: Program codes to start from, e.g. ['7706XMCOMP'].
+    :param year: Academic year of the pages.
+    :param root: Root directory of the snapshots.
+    :param version: Name of the new version, a timestamp if not given.
+    :param workers: Number of pages fetched at the same time.
+    :return: The directory of the new snapshot.
+    """
+    version = version or time.strftime('%Y%m%d-%H%M%S')
+    directory = os.path.join(root, version)
+    pages = dict()
+    to_fetch = {
+        '{}/program/{}'.format(year, code): urljoin(PANDC_URL, '{}/program/{}'.format(year, code))
+        for code in program_codes
+        }
+
+    def fetch_page(key, url):
+        html = fetch.get(url)
+        path = os.path.join('pages', key + '.html')
+        os.makedirs(os.path.dirname(os.path.join(directory, path)), exist_ok=True)
+        with open(os.path.join(directory, path), 'wb') as page_file:
+            page_file.write(html)
+        if re.match(PAGE_REGEX, key).group('page_type') in FOLLOWED_TYPES:
+            return path, get_page_links(html, url, year)
+        return path, dict()
+
+    # Crawl one level of links at a time until no new pages turn up.
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while to_fetch:
+            keys = sorted(to_fetch)
+            results = pool.map(fetch_page, keys, [to_fetch[key] for key in keys])
+            found = dict()
+            for key, (path, links) in zip(keys, results):
+                pages[key] = path
+                found.update(links)
+            to_fetch = {key: url for key, url in found.items() if key not in pages}
+
+    manifest = {
+        'version': version,
+        'year': str(year),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'programs': list(program_codes),
+        'pages': pages,
+        }
+    with open(os.path.join(directory, MANIFEST), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    with open(os.path.join(root, LATEST), 'w') as latest_file:
+        latest_file.write(version)
+    return directory
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build an offline snapshot of P&C pages.')
+    parser.add_argument('programs', nargs='+', help='Program codes, e.g. 7706XMCOMP')
+    parser.add_argument('--year', default='2019')
+    parser.add_argument('--root', default='snapshots')
+    parser.add_argument('--version', default=None)
+    args = parser.parse_args()
+    print(build_snapshot(args.programs, args.year, args.root, args.version))
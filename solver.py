@@ -0,0 +1,191 @@
+"""
+    Honour Project: ANU Study Planner
+"""
+
+"""
+    In this program, we run MiniZinc as a managed subprocess and read what it
+    prints straight from the pipe. The output item of general.mzn prints every
+    solution as one line of JSON, and MiniZinc follows the solutions with a
+    line telling whether the search finished, so the solver output never has
+    to go through a file.
+
+    A run can be given a deadline, and a function telling whether anyone still
+    waits for its result. The solver is killed when either fires, and the best
+    solution it printed until then is kept. On Linux the solver also runs
+    under CPU time and memory limits.
+"""
+
+import json
+import os
+import signal
+import subprocess
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, and prlimit only on Linux. The solver otherwise runs
+    # without resource limits.
+    resource = None
+
+OPTIMAL = 'optimal'
+SATISFIED = 'satisfied'
+UNSATISFIABLE = 'unsatisfiable'
+UNKNOWN = 'unknown'
+ERROR = 'error'
+
+# Printed after every solution.
+SOLUTION_END = '----------'
+# Printed after the last solution once the whole search space was explored.
+SEARCH_COMPLETE = '=========='
+# Printed when the search ends without a solution.
+STATUS_LINES = {
+    '=====UNSATISFIABLE=====': UNSATISFIABLE,
+    '=====UNSATorUNBOUNDED=====': UNSATISFIABLE,
+    '=====UNBOUNDED=====': UNSATISFIABLE,
+    '=====UNKNOWN=====': UNKNOWN,
+    '=====ERROR=====': ERROR,
+    }
+# Seconds between two checks of the deadline and of cancellation.
+WATCH_INTERVAL = 0.2
+
+
+class SolverResult:
+    """
+    What a MiniZinc run printed: the last solution as a dict, and how the search ended.
+    """
+    def __init__(self):
+        self.solution = None
+        self.solutions = 0
+        self.status = UNKNOWN
+        self.returncode = None
+        self.stderr = ''
+        # Set when the solver was killed at its deadline, or because nobody waited for it.
+        self.timed_out = False
+        self.cancelled = False
+        # Seconds the run took, and the MiniZinc solver it used if the caller records it.
+        self.elapsed = None
+        self.solver = None
+
+    def read(self, lines):
+        """
+        Read the output of MiniZinc line by line as it is printed.
+
+        :param lines: Iterable of output lines, e.g. the stdout pipe of the solver.
+        """
+        for line in lines:
+            line = line.strip()
+            if line.startswith('{'):
+                self.solution = json.loads(line)
+                self.solutions = self.solutions + 1
+                self.status = SATISFIED
+            elif line == SEARCH_COMPLETE:
+                # Our models always optimise, so a finished search proves the last
+                # solution optimal.
+                self.status = OPTIMAL if self.solution is not None else UNSATISFIABLE
+            elif line in STATUS_LINES:
+                self.status = STATUS_LINES[line]
+        return self
+
+
+def set_resource_limits(pid, cpu_seconds=None, memory_bytes=None):
+    """
+    Set the resource limits of the solver process once it started. Setting them with
+    preexec_fn is not safe while other threads run, and the solver runs from job workers,
+    portfolio races and request threads.
+
+    :param pid: Process id of the solver.
+    :param cpu_seconds: CPU time the solver may use, after which the system stops it.
+    :param memory_bytes: Size of the address space the solver may use.
+    """
+    if not hasattr(resource, 'prlimit'):
+        return
+    try:
+        if cpu_seconds is not None:
+            resource.prlimit(pid, resource.RLIMIT_CPU, (int(cpu_seconds), int(cpu_seconds)))
+        if memory_bytes is not None:
+            resource.prlimit(pid, resource.RLIMIT_AS, (int(memory_bytes), int(memory_bytes)))
+    except (OSError, ValueError):
+        # The solver already ended, or its limits cannot be lowered that far.
+        pass
+
+
+def _kill(process):
+    """
+    Kill the solver together with the processes it started, which would otherwise keep its
+    output pipe open.
+    """
+    if process.poll() is not None:
+        return
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+            return
+        except OSError:
+            pass
+    process.kill()
+
+
+def _watch(process, result, finished, deadline, cancelled):
+    """Kill the solver once the deadline passed or the run was cancelled."""
+    while not finished.wait(WATCH_INTERVAL):
+        if deadline is not None and time.time() > deadline:
+            result.timed_out = True
+        elif cancelled is not None and cancelled():
+            result.cancelled = True
+        else:
+            continue
+        _kill(process)
+        return
+
+
+def run(cmd, cwd=None, timeout=None, cancelled=None, cpu_seconds=None, memory_bytes=None):
+    """
+    Run MiniZinc and parse its output from the pipe while it runs.
+
+    :param cmd: The command line, a list of arguments.
+    :param cwd: Working directory of the solver.
+    :param timeout: Seconds after which the solver is killed, or None to wait for it.
+    :param cancelled: Function returning True once nobody waits for the result any more,
+    the solver is then killed.
+    :param cpu_seconds: CPU time limit of the solver, see set_resource_limits().
+    :param memory_bytes: Memory limit of the solver, see set_resource_limits().
+    :return: A SolverResult
+    """
+    started = time.time()
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               universal_newlines=True, cwd=cwd,
+                               # A process group of its own, so that _kill() reaches its children.
+                               start_new_session=hasattr(os, 'killpg'))
+    set_resource_limits(process.pid, cpu_seconds, memory_bytes)
+    # Drain stderr on another thread, a full pipe would block the solver.
+    stderr = list()
+    reader = threading.Thread(target=lambda: stderr.append(process.stderr.read()))
+    reader.daemon = True
+    reader.start()
+    result = SolverResult()
+    finished = threading.Event()
+    watcher = None
+    if timeout is not None or cancelled is not None:
+        deadline = time.time() + timeout if timeout is not None else None
+        watcher = threading.Thread(target=_watch, args=(process, result, finished, deadline, cancelled))
+        watcher.daemon = True
+        watcher.start()
+    try:
+        result.read(process.stdout)
+        process.wait()
+    finally:
+        finished.set()
+        if process.poll() is None:
+            _kill(process)
+            process.wait()
+        if watcher is not None:
+            watcher.join()
+        reader.join()
+        process.stdout.close()
+        process.stderr.close()
+    result.returncode = process.returncode
+    result.stderr = ''.join(stderr)
+    result.elapsed = time.time() - started
+    return result
@@ -0,0 +1,82 @@
+"""
+    Honour Project: ANU Study Planner
+"""
+
+"""
+    Tests of data_process.load_catalog: courses of a compiled catalog that a masters plan
+    may not take must not become available.
+
+    Usage:
+        python -m unittest discover tests
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.join(BASE_DIR, 'experiments'))
+
+import data_process as dp
+from check_model_output import mcomp_program_order
+
+
+def catalog_course(semester, prereq=()):
+    """A course as catalog_compiler.py writes it."""
+    return {'semester': semester, 'time_unit': [1], 'prereq': [list(p) for p in prereq],
+            'coreq': [], 'incompat': []}
+
+
+class LoadCatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = (set(dp.AVAILABLE_CODE), dict(dp.SEMESTER), dict(dp.UNIT_TIME_SET),
+                      dp.CATALOG, dp.CATALOG_DIGEST)
+
+    def tearDown(self):
+        available, semester, unit_time_set, catalog, digest = self.saved
+        with dp.course_codes_lock:
+            dp.AVAILABLE_CODE.clear()
+            dp.AVAILABLE_CODE.update(available)
+            dp._course_indexes.clear()
+        dp.SEMESTER.clear()
+        dp.SEMESTER.update(semester)
+        dp.UNIT_TIME_SET.clear()
+        dp.UNIT_TIME_SET.update(unit_time_set)
+        dp.CATALOG, dp.CATALOG_DIGEST = catalog, digest
+        dp.prereq, dp.coreq, dp.incompat = catalog.views()
+
+    def load(self, courses):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'catalog.json')
+            with open(path, 'w') as catalog_file:
+                json.dump({'courses': courses}, catalog_file)
+            dp.load_catalog(path)
+
+    @staticmethod
+    def course_sets():
+        courses = mcomp_program_order().collect_courses()
+        return set(courses.grad_courses), [(i, sorted(codes)) for i, codes in courses.list_arrays]
+
+    def test_undergrad_courses_stay_unavailable(self):
+        before = self.course_sets()
+        self.load({'COMP1100': catalog_course([1, 2]),
+                   'COMP4600': catalog_course([2], prereq=[['COMP1100']])})
+        self.assertNotIn('COMP1100', dp.AVAILABLE_CODE)
+        self.assertNotIn('COMP4600', dp.AVAILABLE_CODE)
+        self.assertEqual(self.course_sets(), before)
+        # Their semesters and requisites are still loaded.
+        self.assertEqual(dp.SEMESTER['COMP1100'], [1, 2])
+        self.assertEqual(dp.prereq['COMP4600'][0][0], 'COMP1100')
+
+    def test_grad_courses_become_available(self):
+        self.load({'COMP8999': catalog_course([1])})
+        self.assertIn('COMP8999', dp.AVAILABLE_CODE)
+        self.assertIn('COMP8999', self.course_sets()[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+    Honour Project: ANU Study Planner
+"""
+
+"""
+    Tests of planning from an offline snapshot: a P&C page missing from the snapshot is
+    reported as such, and paths that are not P&C pages are still read as local files.
+
+    Usage:
+        python -m unittest discover tests
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import data_process as dp
+import fetch
+from snapshot import MANIFEST, PANDC_URL, PageNotInSnapshot, Snapshot
+
+PAGE = '''<html><body><div id="study">
+<h2 id="program-requirements">Program Requirements</h2>
+<p>This program requires the completion of 96 units.</p>
+</div></body></html>'''
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        root = self.directory.name
+        os.makedirs(os.path.join(root, 'pages', '2019', 'program'))
+        with open(os.path.join(root, 'pages', '2019', 'program', '7706XMCOMP.html'), 'w') as page:
+            page.write(PAGE)
+        manifest = {'version': 'test', 'year': '2019',
+                    'pages': {'2019/program/7706XMCOMP': 'pages/2019/program/7706XMCOMP.html'}}
+        with open(os.path.join(root, MANIFEST), 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+        self.snapshot = Snapshot(root)
+        fetch.use_snapshot(self.snapshot)
+
+    def tearDown(self):
+        fetch.use_snapshot(None)
+        self.directory.cleanup()
+
+    def test_page_in_snapshot(self):
+        self.assertEqual(fetch.get(PANDC_URL + '2019/program/7706XMCOMP').decode('utf-8'), PAGE)
+
+    def test_missing_page(self):
+        url = PANDC_URL + '2019/program/7706XMSEC'
+        with self.assertRaises(PageNotInSnapshot) as raised:
+            fetch.get(url)
+        self.assertNotIsInstance(raised.exception, ValueError)
+        # The scraper reports the missing page instead of trying the URL as a file.
+        with self.assertRaises(PageNotInSnapshot):
+            dp.DegreeRuleScraper(url)
+
+    def test_local_file(self):
+        path = os.path.join(self.directory.name, 'orders.html')
+        with open(path, 'w') as page:
+            page.write(PAGE)
+        with self.assertRaises(ValueError):
+            fetch.get(path)
+        dp.DegreeRuleScraper(path)
+
+
+if __name__ == '__main__':
+    unittest.main()